@@ -0,0 +1 @@
+# Offline benchmarks for MultiUploaderX Pro
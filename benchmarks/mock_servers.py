@@ -0,0 +1,116 @@
+import asyncio
+import random
+import zlib
+from aiohttp import web
+
+# Response keys the bot understands, as returned by real providers
+SHORTENER_FORMATS = ['shortenedUrl', 'shorturl', 'short_url', 'url', 'link']
+UPLOADER_FORMATS = ['url', 'link', 'download_url', 'file_url']
+
+class MockBehaviour:
+    """
+    How a mock provider responds.
+    
+    Latency is log-normal around `latency_ms` (median) with spread `sigma`.
+    `error_rate` of requests fail with a 500 and `rate_limit_rate` with a 429
+    carrying `Retry-After: retry_after`. A seeded RNG keeps runs reproducible.
+    """
+    
+    def __init__(self, latency_ms=200, sigma=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=0):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+    
+    async def respond(self, payload):
+        """Sleep for a sampled latency, then return a response"""
+        delay = self.latency_ms / 1000 * self.random.lognormvariate(0, self.sigma)
+        await asyncio.sleep(delay)
+        
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return web.Response(status=429, headers={'Retry-After': str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.Response(status=500)
+        
+        return web.json_response(payload)
+
+class MockProviders:
+    """
+    Local shortener and uploader stubs.
+    
+    Every provider gets its own port, as real providers have their own hosts,
+    so each one gets its own connection pool in the bot.
+    """
+    
+    def __init__(self, behaviour, host='127.0.0.1'):
+        self.behaviour = behaviour
+        self.host = host
+        self.requests = 0
+        self._runner = None
+    
+    async def _shorten(self, request):
+        self.requests += 1
+        key = SHORTENER_FORMATS[int(request.match_info['fmt']) % len(SHORTENER_FORMATS)]
+        target = request.query.get('url', '')
+        return await self.behaviour.respond({key: f"https://short.test/{zlib.crc32(target.encode()):08x}"})
+    
+    async def _upload(self, request):
+        self.requests += 1
+        key = UPLOADER_FORMATS[int(request.match_info['fmt']) % len(UPLOADER_FORMATS)]
+        data = await request.post()
+        target = data.get('url', '')
+        return await self.behaviour.respond({key: f"https://files.test/{zlib.crc32(target.encode()):08x}"})
+    
+    async def start(self):
+        """Prepare the stub application"""
+        app = web.Application()
+        app.router.add_get('/shorten/{fmt}/api', self._shorten)
+        app.router.add_post('/upload/{fmt}', self._upload)
+        
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+    
+    async def _new_site(self):
+        """Listen on a new free port and return its base URL"""
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{port}"
+    
+    async def stop(self):
+        """Stop serving"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+    
+    async def shorteners(self, count, limits=None):
+        """Build shorteners.json entries, cycling through the response formats"""
+        return [
+            {
+                "name": f"Mock Shortener {i + 1}",
+                "base": f"{await self._new_site()}/shorten/{i}/api?api=",
+                "api": f"key{i}",
+                "status": "active",
+                **({"limits": limits} if limits else {})
+            }
+            for i in range(count)
+        ]
+    
+    async def uploaders(self, count, limits=None):
+        """Build uploads.json entries, cycling through the response formats"""
+        return [
+            {
+                "name": f"Mock Uploader {i + 1}",
+                "endpoint": f"{await self._new_site()}/upload/{i}",
+                "api": f"key{i}",
+                "status": "active",
+                "idempotent": True,
+                **({"limits": limits} if limits else {})
+            }
+            for i in range(count)
+        ]
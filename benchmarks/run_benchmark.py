@@ -0,0 +1,190 @@
+"""
+Benchmark the upload pipeline against local mock providers.
+
+Runs fully offline: shorteners and uploaders are stub HTTP servers on localhost,
+and the bot's config files live in a temporary directory. Example:
+
+    python -m benchmarks.run_benchmark --users 20 --requests 10 --latency-ms 150
+    python -m benchmarks.run_benchmark --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.mock_servers import MockBehaviour, MockProviders
+
+def parse_args(argv=None):
+    """Read benchmark settings from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help="concurrent simulated users")
+    parser.add_argument('--requests', type=int, default=5, help="/upload requests per user")
+    parser.add_argument('--shorteners', type=int, default=5, help="mock shorteners")
+    parser.add_argument('--uploaders', type=int, default=4, help="mock uploaders")
+    parser.add_argument('--latency-ms', type=float, default=200, help="median provider latency")
+    parser.add_argument('--sigma', type=float, default=0.5, help="log-normal latency spread")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--retry-after', type=float, default=1, help="Retry-After sent with 429s")
+    parser.add_argument('--provider-rps', type=float, default=0,
+                        help="per-provider rate limit configured in the bot (0 = unlimited)")
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                        help="share of requests that reuse an earlier link")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    parser.add_argument('--compare', help="earlier JSON report to compare against")
+    return parser.parse_args(argv)
+
+def git_commit():
+    """Get the current commit, so reports can be compared across commits"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentile(values, q):
+    """Exact percentile of a sorted list"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+    return values[index]
+
+async def simulated_user(user, args, collect_results, latencies, outcomes, rng):
+    """Send `args.requests` /upload requests one after another, like a user would"""
+    for i in range(args.requests):
+        if latencies and rng.random() < args.repeat_ratio:
+            link = f"https://drive.google.com/file/d/bench-{rng.randrange(user + 1)}-0/view"
+        else:
+            link = f"https://drive.google.com/file/d/bench-{user}-{i}/view"
+        
+        started = time.perf_counter()
+        original_shortened, upload_results = await collect_results(link)
+        latencies.append(time.perf_counter() - started)
+        
+        outcomes['uploads'] += len(upload_results)
+        outcomes['short_links'] += len(original_shortened)
+        outcomes['short_links'] += sum(len(u['shortened']) for u in upload_results)
+
+async def run(args):
+    """Run one benchmark and return its report"""
+    behaviour = MockBehaviour(
+        latency_ms=args.latency_ms,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    providers = MockProviders(behaviour)
+    await providers.start()
+    
+    limits = {"rps": args.provider_rps, "burst": max(1, args.provider_rps), "max_concurrency": 64}
+    
+    with open('shorteners.json', 'w') as f:
+        json.dump(await providers.shorteners(args.shorteners, limits), f)
+    with open('uploads.json', 'w') as f:
+        json.dump(await providers.uploaders(args.uploaders, limits), f)
+    
+    # Import after the config is in place; the bot reads it relative to the working directory
+    from utils.api_handler import collect_results
+    from utils.http_pool import close_all
+    
+    latencies = []
+    outcomes = {'uploads': 0, 'short_links': 0}
+    rng = random.Random(args.seed)
+    
+    tracemalloc.start()
+    started = time.perf_counter()
+    
+    await asyncio.gather(*(
+        simulated_user(user, args, collect_results, latencies, outcomes, rng)
+        for user in range(args.users)
+    ))
+    
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    await close_all()
+    await providers.stop()
+    
+    latencies.sort()
+    total = len(latencies)
+    
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'latency_s': {
+            'p50': round(percentile(latencies, 0.5), 4),
+            'p95': round(percentile(latencies, 0.95), 4),
+            'p99': round(percentile(latencies, 0.99), 4),
+            'max': round(latencies[-1], 4) if latencies else 0.0
+        },
+        'provider_requests': providers.requests,
+        'uploads_per_request': round(outcomes['uploads'] / total, 2) if total else 0.0,
+        'short_links_per_request': round(outcomes['short_links'] / total, 2) if total else 0.0,
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+def print_report(report, baseline=None):
+    """Print a report, with changes against a baseline if given"""
+    def line(label, key, sub=None, unit=''):
+        value = report[key][sub] if sub else report[key]
+        text = f"{label:<24}{value}{unit}"
+        if baseline:
+            before = baseline[key][sub] if sub else baseline[key]
+            if before:
+                text += f"  ({(value - before) / before:+.1%} vs {baseline.get('commit') or 'baseline'})"
+        print(text)
+    
+    print(f"Commit {report['commit']}, {report['requests']} requests in {report['elapsed_s']}s")
+    line("Throughput", 'throughput_rps', unit=' req/s')
+    line("Latency p50", 'latency_s', 'p50', 's')
+    line("Latency p95", 'latency_s', 'p95', 's')
+    line("Latency p99", 'latency_s', 'p99', 's')
+    line("Provider requests", 'provider_requests')
+    line("Uploads per request", 'uploads_per_request')
+    line("Short links per request", 'short_links_per_request')
+    line("Peak memory", 'peak_memory_kb', unit=' KB')
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    
+    output = os.path.abspath(args.output) if args.output else None
+    
+    # Keep the bot's config, caches and logs away from the real ones
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+    
+    with tempfile.TemporaryDirectory(prefix='multiuploader-bench-') as workdir:
+        os.chdir(workdir)
+        report = asyncio.run(run(args))
+    
+    print_report(report, baseline)
+    
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
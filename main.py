@@ -1,4 +1,6 @@
+import asyncio
 import os
+import time
 import logging
 from telegram import Update
 from telegram.ext import (
@@ -13,20 +15,48 @@ from dotenv import load_dotenv
 
 from utils.shortener_manager import (
     add_shortener,
+    add_shortener_key,
+    get_shortener,
     list_shorteners,
     toggle_shortener,
     remove_shortener
 )
 from utils.uploader_manager import (
     add_uploader,
+    add_uploader_key,
+    get_uploader,
+    get_active_uploaders,
     list_uploaders,
     toggle_uploader,
     remove_uploader
 )
-from utils.api_handler import upload_to_platforms, shorten_urls
-from utils.formatter import format_result
+from utils.api_handler import (
+    collect_results,
+    collect_batch,
+    collect_file_results,
+    providers_fingerprint,
+    deadline_in,
+    record_calls
+)
+from utils.links import canonicalize, UnsupportedLink
+from utils import coalescer, job_queue, metrics, sender, preflight, journal, admission, tracing
+from utils.http_pool import sync_pools, close_all
+from utils.webhook import run_webhook, owns_chat
+from utils.formatter import (
+    format_result,
+    format_file_result,
+    IncrementalResult,
+    format_batch_report,
+    format_job,
+    format_queue_stats,
+    format_stats,
+    format_slow_requests,
+    format_history,
+    format_top_stats
+)
+from utils.progress import ProgressMessage
 from utils.permissions import is_admin
-from utils.logger import log_upload
+from utils.logger import log_upload, start_log_writer, stop_log_writer, user_history, top_stats
 
 # Load environment variables
 load_dotenv()
@@ -38,6 +68,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Update delivery: 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Request budgets, overridable per command with deadline=<seconds> k=<count> late=<on|off>
+UPLOAD_DEADLINE = float(os.getenv('UPLOAD_DEADLINE', '0'))
+SHORTEN_QUORUM = int(os.getenv('SHORTEN_QUORUM', '0'))
+LATE_RESULTS = os.getenv('LATE_RESULTS', 'on').lower() in ('1', 'true', 'yes', 'on')
+
+# Batch limits
+BATCH_MAX_LINKS = int(os.getenv('BATCH_MAX_LINKS', '200'))
+BATCH_MAX_FILE_SIZE = 1024 * 1024
+
+# Largest file accepted for direct upload; the Bot API only serves files up to 20 MB
+# unless the bot uses a local Bot API server
+FILE_MAX_SIZE = int(os.getenv('FILE_MAX_SIZE', str(20 * 1024 * 1024)))
+
+# Tasks that outlive their handler, kept referenced until done
+_background_tasks = set()
+
 # Conversation states
 ADD_SHORT_NAME, ADD_SHORT_BASE, ADD_SHORT_API = range(3)
 ADD_UPLOAD_NAME, ADD_UPLOAD_ENDPOINT, ADD_UPLOAD_API = range(3, 6)
@@ -50,7 +99,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Use /upload <drive\\_link> to start\\.\n"
         "Use /help for all commands\\."
     )
-    await update.message.reply_text(welcome_msg, parse_mode='MarkdownV2')
+    sender.reply(update.message, welcome_msg, parse_mode='MarkdownV2')
 
 # Help command
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -60,77 +109,635 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "*General:*\n"
         "/start \\- Welcome message\n"
         "/help \\- Show this help\n"
-        "/upload <link> \\- Upload and shorten a link\n\n"
+        "/upload <link> \\- Upload and shorten a link\n"
+        "Send a file \\- Upload it to every platform\n"
+        "/batchupload <links> \\- Upload many links, or send a \\.txt file\n"
+        "/status <job> \\- Check an upload job\n"
+        "/history \\- Your recent uploads\n\n"
+        "*Monitoring \\(Admin\\):*\n"
+        "/stats \\- Provider latency and error summary\n"
+        "/slow \\[count\\] \\- Where the time went in recent slow requests\n"
+        "/topstats \\[days\\] \\- Top users, links and providers\n"
+        "/history <user\\_id> \\- A user's recent uploads\n\n"
         "*Shortener Management \\(Admin\\):*\n"
-        "/addshort \\- Add new shortener\n"
+        "/addshort \\- Add new shortener, or a key to an existing one\n"
         "/listshort \\- List all shorteners\n"
         "/toggleshort <index> \\- Pause/Resume shortener\n"
         "/removeshort <index> \\- Remove shortener\n\n"
         "*Uploader Management \\(Admin\\):*\n"
-        "/addupload \\- Add new uploader\n"
+        "/addupload \\- Add new uploader, or a key to an existing one\n"
         "/listupload \\- List all uploaders\n"
         "/toggleupload <index> \\- Pause/Resume uploader\n"
         "/removeupload <index> \\- Remove uploader"
     )
-    await update.message.reply_text(help_text, parse_mode='MarkdownV2')
+    sender.reply(update.message, help_text, parse_mode='MarkdownV2')
+
+def parse_upload_options(args):
+    """Read deadline=<seconds>, k=<count> and late=<on|off> options from command arguments"""
+    options = {
+        'deadline': UPLOAD_DEADLINE,
+        'quorum': SHORTEN_QUORUM,
+        'late': LATE_RESULTS
+    }
+    
+    for arg in args:
+        name, _, value = arg.partition('=')
+        
+        if name == 'deadline':
+            options['deadline'] = max(0.0, float(value))
+        elif name == 'k':
+            options['quorum'] = max(0, int(value))
+        elif name == 'late':
+            options['late'] = value.lower() in ('1', 'true', 'yes', 'on')
+        else:
+            raise ValueError(f"Unknown option: {arg}")
+    
+    return options
+
+def render_result(result):
+    """Format a result built by build_result"""
+    with tracing.span('format_result'):
+        text = format_result(result['link'], result['original_shortened'], result['upload_results'])
+    
+    if not result['upload_results']:
+        text += f"\n\n{result['note']}"
+    
+    return text
+
+async def build_result(link, options, on_record=None):
+    """
+    Upload and shorten a link within the request budget.
+    
+    Returns None if no upload platform is active. Otherwise returns the pipeline
+    results plus the 'late' shortener tasks still running after the deadline or
+    quorum; their links are added to the results as they finish. When no platform
+    uploaded the link, the results keep the original link's short links and a
+    'note' saying why. `on_record` is called with each pipeline record as it finishes.
+    """
+    if not get_active_uploaders():
+        return None
+    
+    late = [] if options['late'] else None
+    
+    original_shortened, upload_results = await collect_results(
+        link,
+        deadline=deadline_in(options['deadline']),
+        quorum=options['quorum'],
+        late=late,
+        on_record=on_record
+    )
+    
+    if options['deadline']:
+        note = "⚠️ No platform finished uploading within the deadline."
+    else:
+        note = "⚠️ The link could not be uploaded to any platform."
+    
+    return {
+        'link': link,
+        'original_shortened': original_shortened,
+        'upload_results': upload_results,
+        'late': late or [],
+        'note': note
+    }
+
+async def build_result_once(key, link, options, on_record=None):
+    """Build a result and cache its text for repeat requests, unless nothing was uploaded"""
+    result = await build_result(link, options, on_record)
+    
+    if result and result['upload_results']:
+        coalescer.put_result(key, render_result(result))
+    
+    return result
+
+async def deliver_late_results(message, key, result, result_text):
+    """Edit a sent result once the late shorteners have finished"""
+    await asyncio.wait(result['late'])
+    final_text = render_result(result)
+    
+    if final_text != result_text:
+        if result['upload_results']:
+            coalescer.put_result(key, final_text)
+        sender.edit(message, final_text)
+
+def show_progress(progress, partial):
+    """Get a pipeline callback that edits the processing message as sections finish"""
+    def on_record(record):
+        partial.add(record)
+        progress.update(f"{partial.text()}\n\n⏳ Waiting for more platforms...")
+    
+    return on_record
+
+async def process_upload(bot, chat_id, username, user_id, key, link, options, job, status_message,
+                         journal_id=None, steps=None, trace=None):
+    """
+    Worker side of /upload: build the result and show it in the processing message.
+    
+    `link` is the link as the user sent it, which the providers get; `key` starts
+    with its canonical form, which the link check and the upload log use. Every finished upload and shortening step is journaled under `journal_id`
+    (the job's id by default); a job resumed after a restart passes the `steps`
+    it had finished, and skips them. The request's `trace` continues here; a
+    resumed job starts a new one.
+    """
+    journal_id = journal_id or job['id']
+    journal.bind(journal_id, steps)
+    resumable = False
+    
+    trace = trace or tracing.start('upload', user_id=user_id, link=link, resumed=True)
+    tracing.attach(trace)
+    wait = job['started'] - job['created']
+    tracing.add_span('job_queue', time.monotonic() - wait, job=job['id'])
+    outcome = 'error'
+    
+    try:
+        message = await status_message
+        progress = ProgressMessage(message)
+        
+        # Turn away dead and private links before any provider is called
+        with tracing.span('preflight'):
+            problem = await preflight.check(key[0])
+        if problem:
+            outcome = 'rejected'
+            await progress.finish(f"⚠️ {problem}")
+            return
+        
+        # Concurrent requests for the same link share one job; the first caller streams progress
+        on_record = show_progress(progress, IncrementalResult(link))
+        calls = record_calls()
+        with tracing.span('build_result'):
+            result = await coalescer.run_once(key, lambda: build_result_once(key, link, options, on_record))
+        
+        if not result:
+            outcome = 'no_uploaders'
+            await progress.finish("⚠️ No active upload platforms configured.")
+            return
+        
+        result_text = render_result(result)
+        
+        if result['upload_results']:
+            # Log upload
+            with tracing.span('log_upload'):
+                log_upload(username, user_id, key[0], calls)
+            outcome = 'ok'
+        else:
+            outcome = 'no_uploads'
+        
+        await progress.finish(result_text)
+        
+        # End to end, from the /upload message to the result being sent
+        metrics.observe('upload_latency_seconds', time.time() - job['created'])
+        
+        # Add links from shorteners that answer after the deadline, without holding the worker
+        if result['late']:
+            task = asyncio.create_task(deliver_late_results(message, key, result, result_text))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+    
+    except asyncio.CancelledError:
+        # The bot is stopping; the job stays in the journal and resumes on the next start
+        resumable = True
+        outcome = 'cancelled'
+        raise
+    except Exception as e:
+        logger.error(f"Upload error: {e}")
+        sender.send(bot, chat_id, "⚠️ An error occurred during processing.")
+        raise
+    finally:
+        if not resumable:
+            journal.finish_job(journal_id)
+        tracing.finish(trace, outcome=outcome, job=job['id'])
+
+def resume_jobs(bot):
+    """Queue again the /upload jobs a previous run left unfinished, skipping their finished steps"""
+    for journal_id, kind, data, steps in journal.unfinished_jobs():
+        # With several webhook workers, each resumes the chats it serves
+        if kind != 'upload' or not owns_chat(data['chat_id']):
+            continue
+        
+        try:
+            _resume_upload(bot, journal_id, data, steps)
+        except job_queue.QueueFull:
+            logger.error(f"Could not resume job {journal_id}: the job queue is full")
+            journal.finish_job(journal_id)
+            continue
+        
+        logger.info(f"Resuming job {journal_id} with {len(steps)} finished step(s)")
+
+def _resume_upload(bot, journal_id, data, steps):
+    """Queue one journaled /upload job and tell its chat"""
+    chat_id, link, options = data['chat_id'], data['link'], data['options']
+    key = (canonicalize(link), providers_fingerprint(), options['deadline'], options['quorum'])
+    
+    status_message = asyncio.get_running_loop().create_future()
+    job = job_queue.submit(
+        data['user_id'],
+        lambda job: process_upload(
+            bot, chat_id, data['username'], data['user_id'], key, link, options, job,
+            status_message, journal_id, steps
+        ),
+        description=link,
+        priority=True
+    )
+    
+    sender.send(
+        bot,
+        chat_id,
+        f"♻️ The bot restarted. Resuming your upload of {link}... (job {job['id']})",
+        merge=False,
+        future=status_message
+    )
 
 # Upload command
 async def upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle file upload and shortening"""
     user_id = update.effective_user.id
     username = update.effective_user.username or "Unknown"
+    chat_id = update.effective_chat.id
     
     # Check if link provided
     if not context.args:
-        await update.message.reply_text("⚠️ Please provide a link.\nUsage: /upload <link>")
+        sender.reply(
+            update.message,
+            "⚠️ Please provide a link.\nUsage: /upload <link> [deadline=<seconds>] [k=<count>]"
+        )
         return
     
     original_link = context.args[0]
     
+    try:
+        options = parse_upload_options(context.args[1:])
+    except ValueError:
+        sender.reply(
+            update.message,
+            "⚠️ Invalid option.\nUsage: /upload <link> [deadline=<seconds>] [k=<count>] [late=<on|off>]"
+        )
+        return
+    
     # Validate link format
     if not (original_link.startswith('http://') or original_link.startswith('https://')):
-        await update.message.reply_text("⚠️ Invalid or unsupported link format.")
+        sender.reply(update.message, "⚠️ Invalid or unsupported link format.")
+        return
+    
+    # Share, open and download links for one file share one cache and coalescing key;
+    # the providers still get the link as sent, which may need its fragment or query
+    try:
+        link = canonicalize(original_link)
+    except UnsupportedLink as e:
+        sender.reply(update.message, f"⚠️ {e}")
+        return
+    
+    # Traced from here to the final result, through the job queue and every provider call
+    trace = tracing.start('upload', user_id=user_id, link=link)
+    
+    # Same link with the same active providers gives the same result
+    key = (link, providers_fingerprint(), options['deadline'], options['quorum'])
+    result_text = coalescer.get_result(key)
+    
+    if result_text is not None:
+        with tracing.span('log_upload'):
+            log_upload(username, user_id, link)
+        sender.reply(update.message, result_text).add_done_callback(
+            lambda _: tracing.finish(trace, outcome='cached')
+        )
+        return
+    
+    # Quotas and load shedding apply only to work that reaches the queue
+    problem = admission.admit(user_id, options['deadline'])
+    if problem:
+        tracing.finish(trace, outcome='refused')
+        sender.reply(update.message, f"🚦 {problem}")
+        return
+    
+    # Hand the work to the job queue and answer right away; the job waits for the
+    # answer to be sent, then edits results into it as they arrive
+    status_message = asyncio.get_running_loop().create_future()
+    try:
+        job = job_queue.submit(
+            user_id,
+            admission.releasing(user_id, lambda job: process_upload(
+                context.bot, chat_id, username, user_id, key, original_link, options, job,
+                status_message, trace=trace
+            )),
+            description=original_link,
+            priority=is_admin(user_id)
+        )
+    except job_queue.QueueFull as e:
+        admission.done(user_id)
+        tracing.finish(trace, outcome='refused')
+        sender.reply(update.message, f"🚦 {e} Please try again later.")
         return
     
-    await update.message.reply_text("⏳ Processing your request...")
+    # Journal the job so a restart can pick it up again
+    journal.add_job(job['id'], 'upload', {
+        'chat_id': chat_id,
+        'user_id': user_id,
+        'username': username,
+        'link': original_link,
+        'options': options
+    })
+    
+    sender.reply(
+        update.message,
+        f"⏳ Processing your request... (job {job['id']})\n"
+        f"Use /status {job['id']} to check on it.",
+        merge=False,
+        future=status_message
+    )
+
+async def process_file_upload(bot, chat_id, username, user_id, key, document, file_name, job,
+                              status_message):
+    """Worker side of a sent file: stream it to every platform and show the result"""
+    message = await status_message
+    progress = ProgressMessage(message)
     
     try:
-        # Upload to all active platforms
-        upload_results = upload_to_platforms(original_link)
+        file = await bot.get_file(document.file_id)
+        on_record = show_progress(progress, IncrementalResult(None, file_name))
+        calls = record_calls()
+        
+        # The same file sent twice at once is only streamed once
+        upload_results = await coalescer.run_once(
+            key,
+            lambda: collect_file_results(file.file_path, file_name, document.file_size, on_record)
+        )
         
         if not upload_results:
-            await update.message.reply_text("⚠️ No active upload platforms configured.")
+            await progress.finish("⚠️ The file could not be uploaded to any platform.")
             return
         
-        # Shorten original link
-        original_shortened = shorten_urls(original_link)
+        log_upload(username, user_id, file_name, calls)
         
-        # Format result
-        result_text = format_result(original_link, original_shortened, upload_results)
+        result_text = format_file_result(file_name, upload_results)
+        coalescer.put_result(key, result_text)
+        await progress.finish(result_text)
         
-        # Log upload
-        log_upload(username, user_id, original_link)
+        metrics.observe('upload_latency_seconds', time.time() - job['created'])
+    
+    except Exception as e:
+        logger.error(f"File upload error: {e}")
+        sender.send(bot, chat_id, "⚠️ An error occurred during processing.")
+        raise
+
+# Sent files
+async def upload_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle a document, video or audio file sent to the bot"""
+    user_id = update.effective_user.id
+    username = update.effective_user.username or "Unknown"
+    chat_id = update.effective_chat.id
+    message = update.message
+    
+    document = message.document or message.video or message.audio
+    file_name = getattr(document, 'file_name', None) or document.file_unique_id
+    
+    if document.file_size and document.file_size > FILE_MAX_SIZE:
+        sender.reply(message, f"⚠️ The file is too large. The limit is {FILE_MAX_SIZE // (1024 * 1024)} MB.")
+        return
+    
+    # file_unique_id is the same for every copy of a file
+    key = ('file', document.file_unique_id, providers_fingerprint())
+    result_text = coalescer.get_result(key)
+    
+    if result_text is not None:
+        log_upload(username, user_id, file_name)
+        sender.reply(message, result_text)
+        return
+    
+    problem = admission.admit(user_id)
+    if problem:
+        sender.reply(message, f"🚦 {problem}")
+        return
+    
+    status_message = asyncio.get_running_loop().create_future()
+    try:
+        job = job_queue.submit(
+            user_id,
+            admission.releasing(user_id, lambda job: process_file_upload(
+                context.bot, chat_id, username, user_id, key, document, file_name, job,
+                status_message
+            )),
+            description=file_name,
+            priority=is_admin(user_id)
+        )
+    except job_queue.QueueFull as e:
+        admission.done(user_id)
+        sender.reply(message, f"🚦 {e} Please try again later.")
+        return
+    
+    sender.reply(
+        message,
+        f"⏳ Uploading {file_name}... (job {job['id']})\n"
+        f"Use /status {job['id']} to check on it.",
+        merge=False,
+        future=status_message
+    )
+
+def extract_links(text):
+    """
+    Get the http(s) links in a block of text in order of appearance, as
+    (link as sent, canonical link) pairs, one per canonical link.
+    """
+    links = {}
+    
+    for word in text.split():
+        if not word.startswith(('http://', 'https://')):
+            continue
+        
+        # Folder links can't be uploaded as one file
+        try:
+            links.setdefault(canonicalize(word), word)
+        except UnsupportedLink:
+            continue
+    
+    return [(link, canonical) for canonical, link in links.items()]
+
+async def process_batch(bot, chat_id, username, user_id, links, job):
+    """Worker side of /batchupload: process every link and send one aggregated report"""
+    try:
+        results = await collect_batch(links)
         
-        await update.message.reply_text(result_text)
+        for link, _, upload_results, _, calls in results:
+            if upload_results:
+                log_upload(username, user_id, canonicalize(link), calls)
         
+        report = format_batch_report(results)
+        succeeded = sum(1 for _, _, upload_results, _, _ in results if upload_results)
+        
+        sender.send_document(
+            bot,
+            chat_id,
+            document=report.encode(),
+            filename=f"batch_{job['id']}.json",
+            caption=f"✅ Batch {job['id']} done: {succeeded}/{len(results)} links uploaded."
+        )
+    
     except Exception as e:
-        logger.error(f"Upload error: {e}")
-        await update.message.reply_text("⚠️ An error occurred during processing.")
+        logger.error(f"Batch upload error: {e}")
+        sender.send(bot, chat_id, "⚠️ An error occurred during batch processing.")
+        raise
+
+# Batch upload command
+async def batch_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle many links at once, given in the message or in an attached .txt file"""
+    user_id = update.effective_user.id
+    username = update.effective_user.username or "Unknown"
+    chat_id = update.effective_chat.id
+    message = update.message
+    
+    text = message.text or message.caption or ""
+    
+    # Links can come from a .txt file attached to, or replied to by, the command
+    document = message.document
+    if document is None and message.reply_to_message:
+        document = message.reply_to_message.document
+    
+    if document is not None:
+        if document.file_size and document.file_size > BATCH_MAX_FILE_SIZE:
+            sender.reply(message, "⚠️ The link list is too large.")
+            return
+        
+        file = await context.bot.get_file(document.file_id)
+        data = await file.download_as_bytearray()
+        text += "\n" + data.decode('utf-8', errors='ignore')
+    
+    links = extract_links(text)
+    
+    if not links:
+        sender.reply(
+            message,
+            "⚠️ Please provide links.\n"
+            "Usage: /batchupload <link> <link> ... or send a .txt file of links with /batchupload as caption."
+        )
+        return
+    
+    if len(links) > BATCH_MAX_LINKS:
+        sender.reply(message, f"⚠️ Too many links. The limit is {BATCH_MAX_LINKS} per batch.")
+        return
+    
+    problem = admission.admit(user_id)
+    if problem:
+        sender.reply(message, f"🚦 {problem}")
+        return
+    
+    try:
+        job = job_queue.submit(
+            user_id,
+            admission.releasing(user_id, lambda job: process_batch(context.bot, chat_id, username, user_id, links, job)),
+            description=f"Batch of {len(links)} links",
+            priority=is_admin(user_id)
+        )
+    except job_queue.QueueFull as e:
+        admission.done(user_id)
+        sender.reply(message, f"🚦 {e} Please try again later.")
+        return
+    
+    sender.reply(
+        message,
+        f"⏳ Processing {len(links)} links... (job {job['id']})\n"
+        f"Use /status {job['id']} to check on it."
+    )
+
+# Job status
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show a job's status, or queue statistics for admins"""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        if is_admin(user_id):
+            sender.reply(update.message, format_queue_stats(job_queue.stats(), admission.stats()))
+        else:
+            sender.reply(update.message, "⚠️ Usage: /status <job>")
+        return
+    
+    job = job_queue.get_job(context.args[0])
+    
+    # Users can only see their own jobs
+    if job is None or (job['user_id'] != user_id and not is_admin(user_id)):
+        sender.reply(update.message, "⚠️ Job not found.")
+        return
+    
+    sender.reply(update.message, format_job(job))
+
+# Stats command
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show provider and request metrics"""
+    if not is_admin(update.effective_user.id):
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
+        return
+    
+    sender.reply(update.message, format_stats())
+
+async def slow(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show where the time went in the last slow requests"""
+    if not is_admin(update.effective_user.id):
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
+        return
+    
+    try:
+        count = int(context.args[0]) if context.args else 5
+    except ValueError:
+        sender.reply(update.message, "⚠️ Usage: /slow [count]")
+        return
+    
+    traces = tracing.slow_requests(max(1, min(count, 20)))
+    sender.reply(update.message, format_slow_requests(traces), merge=False)
+
+# Upload history
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show a user's recent uploads and counts; admins can pass any user id"""
+    user_id = update.effective_user.id
+    
+    if context.args:
+        if not is_admin(user_id):
+            sender.reply(update.message, "🚫 Only admins can see other users' history.")
+            return
+        try:
+            user_id = int(context.args[0])
+        except ValueError:
+            sender.reply(update.message, "⚠️ Usage: /history [user_id]")
+            return
+    
+    result = await asyncio.to_thread(user_history, user_id)
+    sender.reply(update.message, format_history(user_id, result), merge=False)
+
+async def topstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show top users, links and providers over the last days"""
+    if not is_admin(update.effective_user.id):
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
+        return
+    
+    try:
+        days = int(context.args[0]) if context.args else 7
+    except ValueError:
+        sender.reply(update.message, "⚠️ Usage: /topstats [days]")
+        return
+    
+    result = await asyncio.to_thread(top_stats, max(1, min(days, 365)))
+    sender.reply(update.message, format_top_stats(result), merge=False)
 
 # Add shortener conversation
 async def add_short_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start add shortener conversation"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return ConversationHandler.END
     
-    await update.message.reply_text("Please enter the shortener name:")
+    sender.reply(update.message, "Please enter the shortener name:")
     return ADD_SHORT_NAME
 
 async def add_short_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive shortener name"""
     context.user_data['short_name'] = update.message.text
-    await update.message.reply_text(
+    
+    # An existing name gets another key for its pool
+    if get_shortener(update.message.text):
+        context.user_data.pop('short_base', None)
+        sender.reply(
+            update.message,
+            "🔑 This shortener already exists. Enter another API key to add to its pool:"
+        )
+        return ADD_SHORT_API
+    
+    sender.reply(
+        update.message,
         "Please enter the base API URL (example: https://gplinks.in/api?api=):"
     )
     return ADD_SHORT_BASE
@@ -138,21 +745,27 @@ async def add_short_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def add_short_base(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive shortener base URL"""
     context.user_data['short_base'] = update.message.text
-    await update.message.reply_text("Please enter your API key:")
+    sender.reply(update.message, "Please enter your API key:")
     return ADD_SHORT_API
 
 async def add_short_api(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive API key and save shortener"""
     api_key = update.message.text
     name = context.user_data['short_name']
-    base = context.user_data['short_base']
+    base = context.user_data.get('short_base')
     
-    success = add_shortener(name, base, api_key)
+    if base is None:
+        success = add_shortener_key(name, api_key)
+        done_text = f"✅ API key added to shortener '{name}'!"
+    else:
+        success = add_shortener(name, base, api_key)
+        done_text = f"✅ Shortener '{name}' added successfully!"
     
     if success:
-        await update.message.reply_text(f"✅ Shortener '{name}' added successfully!")
+        context.application.create_task(sync_pools())
+        sender.reply(update.message, done_text)
     else:
-        await update.message.reply_text("⚠️ Failed to add shortener. Please try again.")
+        sender.reply(update.message, "⚠️ Failed to add shortener. Please try again.")
     
     context.user_data.clear()
     return ConversationHandler.END
@@ -161,58 +774,70 @@ async def add_short_api(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_short(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all shorteners"""
     shorteners = list_shorteners()
-    await update.message.reply_text(shorteners)
+    sender.reply(update.message, shorteners)
 
 # Toggle shortener
 async def toggle_short(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggle shortener status"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return
     
     if not context.args:
-        await update.message.reply_text("⚠️ Usage: /toggleshort <index>")
+        sender.reply(update.message, "⚠️ Usage: /toggleshort <index>")
         return
     
     try:
         index = int(context.args[0]) - 1
         result = toggle_shortener(index)
-        await update.message.reply_text(result)
+        sender.reply(update.message, result)
     except ValueError:
-        await update.message.reply_text("⚠️ Invalid index. Please provide a number.")
+        sender.reply(update.message, "⚠️ Invalid index. Please provide a number.")
 
 # Remove shortener
 async def remove_short(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove shortener"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return
     
     if not context.args:
-        await update.message.reply_text("⚠️ Usage: /removeshort <index>")
+        sender.reply(update.message, "⚠️ Usage: /removeshort <index>")
         return
     
     try:
         index = int(context.args[0]) - 1
         result = remove_shortener(index)
-        await update.message.reply_text(result)
+        context.application.create_task(sync_pools())
+        sender.reply(update.message, result)
     except ValueError:
-        await update.message.reply_text("⚠️ Invalid index. Please provide a number.")
+        sender.reply(update.message, "⚠️ Invalid index. Please provide a number.")
 
 # Add uploader conversation
 async def add_upload_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start add uploader conversation"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return ConversationHandler.END
     
-    await update.message.reply_text("Enter upload platform name:")
+    sender.reply(update.message, "Enter upload platform name:")
     return ADD_UPLOAD_NAME
 
 async def add_upload_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive uploader name"""
     context.user_data['upload_name'] = update.message.text
-    await update.message.reply_text(
+    
+    # An existing name gets another key for its pool
+    if get_uploader(update.message.text):
+        context.user_data.pop('upload_endpoint', None)
+        sender.reply(
+            update.message,
+            "🔑 This uploader already exists. Enter another API key to add to its pool:"
+        )
+        return ADD_UPLOAD_API
+    
+    sender.reply(
+        update.message,
         "Enter API endpoint (example: https://filepress.in/api/upload):"
     )
     return ADD_UPLOAD_ENDPOINT
@@ -220,21 +845,27 @@ async def add_upload_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def add_upload_endpoint(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive uploader endpoint"""
     context.user_data['upload_endpoint'] = update.message.text
-    await update.message.reply_text("Enter API key:")
+    sender.reply(update.message, "Enter API key:")
     return ADD_UPLOAD_API
 
 async def add_upload_api(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive API key and save uploader"""
     api_key = update.message.text
     name = context.user_data['upload_name']
-    endpoint = context.user_data['upload_endpoint']
+    endpoint = context.user_data.get('upload_endpoint')
     
-    success = add_uploader(name, endpoint, api_key)
+    if endpoint is None:
+        success = add_uploader_key(name, api_key)
+        done_text = f"✅ API key added to uploader '{name}'!"
+    else:
+        success = add_uploader(name, endpoint, api_key)
+        done_text = f"✅ Uploader '{name}' added successfully!"
     
     if success:
-        await update.message.reply_text(f"✅ Uploader '{name}' added successfully!")
+        context.application.create_task(sync_pools())
+        sender.reply(update.message, done_text)
     else:
-        await update.message.reply_text("⚠️ Failed to add uploader. Please try again.")
+        sender.reply(update.message, "⚠️ Failed to add uploader. Please try again.")
     
     context.user_data.clear()
     return ConversationHandler.END
@@ -243,66 +874,92 @@ async def add_upload_api(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all uploaders"""
     uploaders = list_uploaders()
-    await update.message.reply_text(uploaders)
+    sender.reply(update.message, uploaders)
 
 # Toggle uploader
 async def toggle_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Toggle uploader status"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return
     
     if not context.args:
-        await update.message.reply_text("⚠️ Usage: /toggleupload <index>")
+        sender.reply(update.message, "⚠️ Usage: /toggleupload <index>")
         return
     
     try:
         index = int(context.args[0]) - 1
         result = toggle_uploader(index)
-        await update.message.reply_text(result)
+        sender.reply(update.message, result)
     except ValueError:
-        await update.message.reply_text("⚠️ Invalid index. Please provide a number.")
+        sender.reply(update.message, "⚠️ Invalid index. Please provide a number.")
 
 # Remove uploader
 async def remove_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove uploader"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("🚫 You don't have permission to use this command.")
+        sender.reply(update.message, "🚫 You don't have permission to use this command.")
         return
     
     if not context.args:
-        await update.message.reply_text("⚠️ Usage: /removeupload <index>")
+        sender.reply(update.message, "⚠️ Usage: /removeupload <index>")
         return
     
     try:
         index = int(context.args[0]) - 1
         result = remove_uploader(index)
-        await update.message.reply_text(result)
+        context.application.create_task(sync_pools())
+        sender.reply(update.message, result)
     except ValueError:
-        await update.message.reply_text("⚠️ Invalid index. Please provide a number.")
+        sender.reply(update.message, "⚠️ Invalid index. Please provide a number.")
 
 # Cancel conversation
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel conversation"""
-    await update.message.reply_text("❌ Operation cancelled.")
+    sender.reply(update.message, "❌ Operation cancelled.")
     context.user_data.clear()
     return ConversationHandler.END
 
 # Unknown command handler
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle unknown commands"""
-    await update.message.reply_text("❌ Unknown command. Type /help for options.")
+    sender.reply(update.message, "❌ Unknown command. Type /help for options.")
 
-def main():
-    """Start the bot"""
-    token = os.getenv('BOT_TOKEN')
-    
-    if not token:
-        logger.error("BOT_TOKEN not found in .env file")
-        return
-    
+async def post_init(application: Application):
+    """Start background writers, resume interrupted jobs and pre-connect to every configured provider host"""
+    await start_log_writer()
+    await journal.start_journal()
+    await tracing.start_trace_writer()
+    await metrics.start_server()
+    sender.start()
+    job_queue.start_workers()
+    resume_jobs(application.bot)
+    await sync_pools()
+
+async def post_stop(application: Application):
+    """Stop the job workers and send the queued messages while the bot can still send"""
+    await job_queue.stop_workers()
+    await sender.stop()
+
+async def post_shutdown(application: Application):
+    """Flush pending writes and release network resources when the bot stops"""
+    await journal.stop_journal()
+    await tracing.stop_trace_writer()
+    await stop_log_writer()
+    await metrics.stop_server()
+    await close_all()
+
+def build_application(token):
+    """Create the application with every handler registered"""
     # Create application
-    app = Application.builder().token(token).build()
+    app = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Add shortener conversation handler
     add_short_conv = ConversationHandler(
@@ -329,7 +986,23 @@ def main():
     # Add handlers
     app.add_handler(CommandHandler('start', start))
     app.add_handler(CommandHandler('help', help_command))
-    app.add_handler(CommandHandler('upload', upload))
+    # Updates stay sequential for the conversations; only /upload runs alongside them
+    app.add_handler(CommandHandler('upload', upload, block=False))
+    app.add_handler(CommandHandler('batchupload', batch_upload))
+    app.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/batchupload(@\w+)?(\s|$)'),
+        batch_upload
+    ))
+    # Only in private chats, so files shared in groups the bot is in are not uploaded
+    app.add_handler(MessageHandler(
+        filters.ChatType.PRIVATE & (filters.Document.ALL | filters.VIDEO | filters.AUDIO),
+        upload_file
+    ))
+    app.add_handler(CommandHandler('status', status))
+    app.add_handler(CommandHandler('stats', stats))
+    app.add_handler(CommandHandler('slow', slow))
+    app.add_handler(CommandHandler('topstats', topstats))
+    app.add_handler(CommandHandler('history', history))
     
     app.add_handler(add_short_conv)
     app.add_handler(CommandHandler('listshort', list_short))
@@ -343,9 +1016,23 @@ def main():
     
     app.add_handler(MessageHandler(filters.COMMAND, unknown))
     
+    return app
+
+def main():
+    """Start the bot"""
+    token = os.getenv('BOT_TOKEN')
+    
+    if not token:
+        logger.error("BOT_TOKEN not found in .env file")
+        return
+    
     # Start bot
-    logger.info("Bot started!")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == 'webhook':
+        logger.info("Bot started in webhook mode!")
+        run_webhook(token, build_application)
+    else:
+        logger.info("Bot started!")
+        build_application(token).run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,166 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils import job_queue, metrics, registry
+from utils.permissions import is_admin
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TIERS_FILE = 'tiers.json'
+
+# Default per-user quota, overridable from .env: requests per minute, burst, and
+# jobs queued or running at once (0 disables a limit)
+ADMISSION_RATE = float(os.getenv('ADMISSION_RATE', '10'))
+ADMISSION_BURST = float(os.getenv('ADMISSION_BURST', '5'))
+ADMISSION_INFLIGHT = int(os.getenv('ADMISSION_INFLIGHT', '3'))
+
+# Jobs queued or running at once for the whole bot
+ADMISSION_GLOBAL_INFLIGHT = int(os.getenv('ADMISSION_GLOBAL_INFLIGHT', '200'))
+
+# Load shedding: share of the job queue in use, and average queue wait in seconds,
+# above which new jobs are refused
+ADMISSION_SHED_QUEUE = float(os.getenv('ADMISSION_SHED_QUEUE', '0.8'))
+ADMISSION_SHED_WAIT = float(os.getenv('ADMISSION_SHED_WAIT', '30'))
+
+# Users whose rate buckets are remembered; the least recently seen are forgotten first
+ADMISSION_MAX_USERS = int(os.getenv('ADMISSION_MAX_USERS', '100000'))
+
+DEFAULT_TIER = {'name': 'default', 'rate': ADMISSION_RATE, 'burst': ADMISSION_BURST, 'inflight': ADMISSION_INFLIGHT}
+
+# User id -> [tokens, last refill], most recently seen last
+_buckets = OrderedDict()
+
+# User id -> jobs queued or running; only users with some
+_inflight = {}
+_total_inflight = 0
+
+def _build_tiers(tiers):
+    """Map user ids to their tier from tiers.json"""
+    users = {}
+    
+    for tier in tiers:
+        limits = dict(DEFAULT_TIER, **{k: v for k, v in tier.items() if k != 'users'})
+        for user_id in tier.get('users', []):
+            users[int(user_id)] = limits
+    
+    return users
+
+def get_tier(user_id):
+    """Get a user's quota: their tier from tiers.json, or the default"""
+    return registry.derived(TIERS_FILE, _build_tiers).get(user_id, DEFAULT_TIER)
+
+def _take_token(user_id, tier):
+    """Take a token from the user's bucket; False if it is empty"""
+    if tier['rate'] <= 0:
+        return True
+    
+    now = time.monotonic()
+    burst = max(1.0, float(tier['burst']))
+    
+    bucket = _buckets.get(user_id)
+    if bucket is None:
+        # New and forgotten users start with a full bucket
+        bucket = _buckets[user_id] = [burst, now]
+        while len(_buckets) > ADMISSION_MAX_USERS:
+            _buckets.popitem(last=False)
+    else:
+        _buckets.move_to_end(user_id)
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * tier['rate'] / 60)
+        bucket[1] = now
+    
+    if bucket[0] < 1:
+        return False
+    
+    bucket[0] -= 1
+    return True
+
+def _shed_reason(deadline):
+    """Check if the bot is too loaded to take new work, returning why or None"""
+    stats = job_queue.stats()
+    
+    if stats['queued'] >= stats['capacity'] * ADMISSION_SHED_QUEUE:
+        return 'queue'
+    
+    # Only a wait measured while jobs are still waiting says anything about a new one
+    if stats['queued'] and stats['avg_wait'] >= ADMISSION_SHED_WAIT:
+        return 'wait'
+    if stats['queued'] and deadline and stats['avg_wait'] >= deadline:
+        return 'deadline'
+    
+    return None
+
+def admit(user_id, deadline=0):
+    """
+    Decide whether a user may start a new job.
+    
+    Returns None and counts the job in flight, to be given back with done(),
+    or a message saying why it was refused. Admins skip the quotas and load
+    shedding. `deadline` is the job's deadline in seconds, 0 for none.
+    """
+    global _total_inflight
+    
+    if not is_admin(user_id):
+        tier = get_tier(user_id)
+        if ADMISSION_GLOBAL_INFLIGHT and _total_inflight >= ADMISSION_GLOBAL_INFLIGHT:
+            reason = 'global'
+        else:
+            reason = _shed_reason(deadline)
+        
+        if reason:
+            # Refused before the user's bucket is touched, so a shed request costs no quota
+            message = "The bot is overloaded right now. Please try again in a minute."
+        elif tier['inflight'] and _inflight.get(user_id, 0) >= tier['inflight']:
+            reason = 'concurrency'
+            message = f"You already have {tier['inflight']} jobs in progress. Wait for one to finish."
+        elif not _take_token(user_id, tier):
+            reason = 'rate'
+            message = f"You are sending requests too fast (limit {tier['rate']:g} per minute)."
+        
+        if reason:
+            metrics.inc('admission_total', result=reason)
+            return message
+    
+    metrics.inc('admission_total', result='admitted')
+    _inflight[user_id] = _inflight.get(user_id, 0) + 1
+    _total_inflight += 1
+    metrics.set_gauge('admission_inflight', _total_inflight)
+    
+    return None
+
+def done(user_id):
+    """Give back an admitted job's slot once it finishes or is not queued after all"""
+    global _total_inflight
+    
+    count = _inflight.get(user_id, 0) - 1
+    if count < 0:
+        return
+    
+    if count:
+        _inflight[user_id] = count
+    else:
+        del _inflight[user_id]
+    
+    _total_inflight -= 1
+    metrics.set_gauge('admission_inflight', _total_inflight)
+
+def releasing(user_id, run):
+    """Wrap a job's run function so the job gives back its slot when it ends"""
+    async def run_admitted(job):
+        try:
+            await run(job)
+        finally:
+            done(user_id)
+    
+    return run_admitted
+
+def stats():
+    """Get jobs in flight and users tracked"""
+    return {
+        'inflight': _total_inflight,
+        'inflight_limit': ADMISSION_GLOBAL_INFLIGHT,
+        'users': len(_buckets)
+    }
@@ -1,126 +1,665 @@
-import requests
+import asyncio
+import base64
+import contextvars
+import hashlib
+import json
 import logging
+import os
+import time
+from urllib.parse import urljoin
+import aiohttp
+from dotenv import load_dotenv
 from utils.shortener_manager import get_active_shorteners
 from utils.uploader_manager import get_active_uploaders
+from utils.http_pool import get_session
+from utils.ingest import FanOut, download_chunks
+from utils import short_cache, rate_limiter, circuit_breaker, retry, metrics, key_pool, preflight, journal, tracing
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-def shorten_url(shortener, url):
-    """Shorten a single URL using a shortener"""
-    try:
-        # Construct API URL
-        api_url = f"{shortener['base']}{shortener['api']}&url={url}"
+SHORTEN_TIMEOUT = aiohttp.ClientTimeout(total=10)
+UPLOAD_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+# File uploads run as long as data keeps flowing
+FILE_UPLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=120)
+
+# Bytes per PATCH for uploaders speaking the resumable (tus) protocol, overridable from .env
+TUS_CHUNK_SIZE = int(os.getenv('TUS_CHUNK_SIZE', str(4 * 1024 * 1024)))
+
+# Share of a request's deadline given to the upload stage, overridable from .env
+UPLOAD_STAGE_SHARE = float(os.getenv('UPLOAD_STAGE_SHARE', '0.6'))
+
+# Links processed at once across all batches, overridable from .env
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '5'))
+_batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+# Provider calls of the current request, for its log entry, when it asked for them
+_calls = contextvars.ContextVar('provider_calls', default=None)
+
+def deadline_in(seconds):
+    """Get the loop time `seconds` from now, or None for no deadline"""
+    if not seconds:
+        return None
+    return asyncio.get_running_loop().time() + seconds
+
+def _remaining(deadline):
+    """Seconds left until a deadline, or None for no deadline"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+def providers_fingerprint():
+    """Fingerprint the active shorteners and uploaders, so results can be cached per provider set"""
+    parts = [short_cache.shortener_identity(s) for s in get_active_shorteners()]
+    parts += [f"{u['name']}\n{u['endpoint']}\n{u['api']}" for u in get_active_uploaders()]
+    
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:16]
+
+async def _call_provider(kind, entry, request, *args):
+    """Call a provider, retrying transient failures, and return None if it fails"""
+    # Shortener GETs are safe to repeat; upload POSTs only when the uploader says so
+    idempotent = kind == 'shortener' or entry.get('idempotent', False)
+    attempt = 0
+    
+    while True:
+        result, error = await _attempt_provider(kind, entry, request, *args)
         
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
+        if error is None:
+            return result
         
-        data = response.json()
-        
-        # Different shorteners may return data differently
-        # Try common response formats
-        if 'shortenedUrl' in data:
-            return data['shortenedUrl']
-        elif 'shorturl' in data:
-            return data['shorturl']
-        elif 'short_url' in data:
-            return data['short_url']
-        elif 'url' in data:
-            return data['url']
-        elif 'link' in data:
-            return data['link']
-        else:
-            logger.warning(f"Unknown response format from {shortener['name']}: {data}")
+        delay = retry.next_delay(error, attempt, idempotent)
+        
+        # A key the provider turned down did no work, so even uploads may move on to another key
+        if delay is None and attempt + 1 < retry.RETRY_MAX_ATTEMPTS:
+            if key_pool.get_pool(kind, entry).can_fail_over(error):
+                delay = 0.0
+        
+        if delay is None:
+            logger.error(f"{kind.capitalize()} {entry['name']} failed ({retry.classify(error)}): {retry.describe(error)}")
             return None
-            
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Shortener {shortener['name']} failed: {e}")
-        return None
+        
+        logger.warning(
+            f"{kind.capitalize()} {entry['name']} failed ({retry.classify(error)}), "
+            f"retrying in {delay:.1f}s"
+        )
+        metrics.inc('provider_retries_total', kind=kind, provider=entry['name'])
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def _attempt_provider(kind, entry, request, *args, streamed=False):
+    """
+    Make one call through the provider's circuit breaker, key pool and rate limiter.
+    
+    Returns (result, None) on success or when the call is skipped, and
+    (None, error) on failure. A `streamed` call's duration follows the file's
+    size, so it is kept out of the breaker's latency average.
+    """
+    breaker = circuit_breaker.get_breaker(kind, entry)
+    
+    # Skip providers that are known to be down
+    if not breaker.allow():
+        metrics.inc('provider_requests_total', kind=kind, provider=entry['name'], result='skipped')
+        return None, None
+    
+    # Skip providers whose keys are all retired
+    pool = key_pool.get_pool(kind, entry)
+    api_key = pool.acquire()
+    if api_key is None:
+        breaker.cancel_probe()
+        metrics.inc('provider_requests_total', kind=kind, provider=entry['name'], result='no_key')
+        return None, None
+    
+    limiter = rate_limiter.get_limiter(kind, entry)
+    waited = time.monotonic()
+    try:
+        await limiter.acquire()
+    except asyncio.CancelledError:
+        pool.release(api_key)
+        breaker.cancel_probe()
+        raise
+    
+    started = time.monotonic()
+    
+    try:
+        # One span per attempt, with the time spent waiting for the rate limiter
+        with tracing.span('attempt', provider=entry['name'], limiter_wait=round(started - waited, 4)):
+            result = await request(dict(entry, api=api_key), *args)
+    except asyncio.CancelledError:
+        pool.release(api_key)
+        limiter.release(rate_limiter.ERROR)
+        breaker.cancel_probe()
+        raise
     except Exception as e:
-        logger.error(f"Error shortening with {shortener['name']}: {e}")
-        return None
+        error_class = retry.classify(e)
+        overloaded = error_class in (retry.RATE_LIMITED, retry.SERVER, retry.TIMEOUT)
+        latency = time.monotonic() - started
+        limiter.release(rate_limiter.OVERLOAD if overloaded else rate_limiter.ERROR)
+        
+        # A bad key is the pool's problem, not a sign the provider is down; nor is a
+        # 4xx for a bad link, which counts as an answer
+        if pool.release(api_key, e):
+            breaker.cancel_probe()
+        else:
+            breaker.record(error_class not in retry.PROVIDER_FAULTS, None if streamed else latency)
+        
+        _record_call(kind, entry, error_class, latency)
+        return None, e
+    
+    latency = time.monotonic() - started
+    pool.release(api_key)
+    limiter.release(rate_limiter.OK)
+    breaker.record(True, None if streamed else latency)
+    _record_call(kind, entry, 'ok', latency)
+    return result, None
+
+def _record_call(kind, entry, result, latency):
+    """Record a provider call's outcome and latency"""
+    metrics.inc('provider_requests_total', kind=kind, provider=entry['name'], result=result)
+    metrics.observe('provider_latency_seconds', latency, kind=kind, provider=entry['name'])
+    
+    calls = _calls.get()
+    if calls is not None:
+        calls.append({'kind': kind, 'provider': entry['name'], 'result': result, 'latency': round(latency, 4)})
+
+def record_calls():
+    """
+    Collect the provider calls made from here on by the current task and the
+    tasks it starts; returns the list they are added to.
+    """
+    calls = []
+    _calls.set(calls)
+    return calls
+
+async def shorten_url(shortener, url):
+    """Shorten a single URL using a shortener"""
+    with tracing.span('shorten_url', provider=shortener['name']) as span:
+        cached = short_cache.get(shortener, url)
+        span['cached'] = bool(cached)
+        if cached:
+            metrics.inc('short_cache_requests_total', result='hit')
+            return cached
+        
+        metrics.inc('short_cache_requests_total', result='miss')
+        
+        short_url = await _call_provider('shortener', shortener, _request_short_url, url)
+        span['ok'] = bool(short_url)
+    
+    if short_url:
+        short_cache.put(shortener, url, short_url)
+    
+    return short_url
+
+async def _request_short_url(shortener, url):
+    """Call a shortener's API for a single URL"""
+    # Construct API URL
+    api_url = f"{shortener['base']}{shortener['api']}&url={url}"
+    
+    async with get_session(api_url).get(api_url, timeout=SHORTEN_TIMEOUT) as response:
+        response.raise_for_status()
+        body = await response.read()
+    
+    metrics.inc('provider_bytes_total', len(body), kind='shortener', provider=shortener['name'])
+    data = json.loads(body)
+    
+    # Different shorteners may return data differently
+    # Try common response formats
+    if 'shortenedUrl' in data:
+        return data['shortenedUrl']
+    elif 'shorturl' in data:
+        return data['shorturl']
+    elif 'short_url' in data:
+        return data['short_url']
+    elif 'url' in data:
+        return data['url']
+    elif 'link' in data:
+        return data['link']
+    else:
+        raise retry.BadResponse(f"Unknown response format: {data}")
 
-def shorten_urls(url):
-    """Shorten URL using all active shorteners"""
+async def shorten_urls(url, quorum=0, deadline=None, late=None):
+    """
+    Shorten URL using all active shorteners concurrently.
+    
+    With a `quorum` of K, return as soon as K shorteners succeed; with a
+    `deadline`, return whatever is ready when it passes. Stragglers are
+    cancelled, unless a `late` list is given: then they keep running, are
+    added to that list, and append their links to the returned list when done.
+    """
     shorteners = get_active_shorteners()
     
     if not shorteners:
         return []
     
-    shortened_urls = []
-    for shortener in shorteners:
-        shortened = shorten_url(shortener, url)
-        if shortened:
-            shortened_urls.append(shortened)
+    if not quorum and deadline is None:
+        # Results keep the configured shortener order
+        results = await asyncio.gather(*(shorten_url(s, url) for s in shorteners))
+        return [shortened for shortened in results if shortened]
+    
+    tasks = [asyncio.ensure_future(shorten_url(s, url)) for s in shorteners]
+    pending = set(tasks)
+    successes = 0
+    
+    while pending and not (quorum and successes >= quorum):
+        done, pending = await asyncio.wait(
+            pending,
+            timeout=_remaining(deadline),
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            break
+        successes += sum(1 for task in done if task.result())
+    
+    shortened_urls = [task.result() for task in tasks if task.done() and task.result()]
+    
+    for task in pending:
+        if late is None:
+            task.cancel()
+        else:
+            task.add_done_callback(
+                lambda t: shortened_urls.append(t.result()) if not t.cancelled() and t.result() else None
+            )
+            late.append(task)
     
     return shortened_urls
 
-def upload_to_platform(uploader, file_url):
+async def upload_to_platform(uploader, file_url):
     """Upload a file to a specific platform"""
-    try:
-        # Prepare the request based on common API patterns
-        # Most upload APIs accept either 'url' or 'link' parameter
-        
-        headers = {
-            'Authorization': f"Bearer {uploader['api']}"
-        }
-        
-        data = {
-            'url': file_url,
-            'api_key': uploader['api']
-        }
-        
-        response = requests.post(
-            uploader['endpoint'],
-            headers=headers,
-            data=data,
-            timeout=30
-        )
+    with tracing.span('upload_to_platform', provider=uploader['name']) as span:
+        result = await _call_provider('uploader', uploader, _request_upload, file_url)
+        span['ok'] = bool(result)
+    
+    return result
+
+async def _request_upload(uploader, file_url):
+    """Call an uploader's API for a single file URL"""
+    # Prepare the request based on common API patterns
+    # Most upload APIs accept either 'url' or 'link' parameter
+    
+    headers = {
+        'Authorization': f"Bearer {uploader['api']}"
+    }
+    
+    data = {
+        'url': file_url,
+        'api_key': uploader['api']
+    }
+    
+    async with get_session(uploader['endpoint']).post(
+        uploader['endpoint'],
+        headers=headers,
+        data=data,
+        timeout=UPLOAD_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        body = await response.read()
+    
+    metrics.inc('provider_bytes_total', len(body), kind='uploader', provider=uploader['name'])
+    
+    return _parse_upload_response(json.loads(body))
+
+def _parse_upload_response(result):
+    """Get the uploaded file's URL from an uploader's JSON response"""
+    # Try common response formats
+    if 'url' in result:
+        return result['url']
+    elif 'link' in result:
+        return result['link']
+    elif 'download_url' in result:
+        return result['download_url']
+    elif 'file_url' in result:
+        return result['file_url']
+    else:
+        raise retry.BadResponse(f"Unknown response format: {result}")
+
+async def upload_file_to_platform(uploader, chunks, file_name, file_size):
+    """
+    Stream a file to a specific platform.
+    
+    The chunks can only be read once, so the call is not retried; uploaders with
+    "protocol": "tus" resume interrupted chunks instead.
+    """
+    if uploader.get('protocol') == 'tus':
+        request = _request_tus_upload
+    else:
+        request = _request_file_upload
+    
+    result, error = await _attempt_provider(
+        'uploader', uploader, request, chunks, file_name, file_size, streamed=True
+    )
+    
+    if error is not None:
+        logger.error(f"Uploader {uploader['name']} failed ({retry.classify(error)}): {retry.describe(error)}")
+    
+    return result
+
+async def _request_file_upload(uploader, chunks, file_name, file_size):
+    """Stream a file to an uploader as a multipart form"""
+    headers = {
+        'Authorization': f"Bearer {uploader['api']}"
+    }
+    
+    with aiohttp.MultipartWriter('form-data') as form:
+        part = form.append(uploader['api'])
+        part.set_content_disposition('form-data', name='api_key')
         
+        part = form.append(chunks, {'Content-Type': 'application/octet-stream'})
+        part.set_content_disposition('form-data', name=uploader.get('file_field', 'file'), filename=file_name)
+    
+    async with get_session(uploader['endpoint']).post(
+        uploader['endpoint'],
+        headers=headers,
+        data=form,
+        timeout=FILE_UPLOAD_TIMEOUT
+    ) as response:
         response.raise_for_status()
-        result = response.json()
-        
-        # Try common response formats
-        if 'url' in result:
-            return result['url']
-        elif 'link' in result:
-            return result['link']
-        elif 'download_url' in result:
-            return result['download_url']
-        elif 'file_url' in result:
-            return result['file_url']
-        else:
-            logger.warning(f"Unknown response format from {uploader['name']}: {result}")
-            return None
+        body = await response.read()
+    
+    metrics.inc('provider_bytes_total', len(body), kind='uploader', provider=uploader['name'])
+    
+    return _parse_upload_response(json.loads(body))
+
+async def _request_tus_upload(uploader, chunks, file_name, file_size):
+    """
+    Stream a file to an uploader with the tus resumable upload protocol.
+    
+    The upload is created with a POST to the endpoint, then sent in PATCHes of
+    the uploader's "chunk_size" (TUS_CHUNK_SIZE by default). The new upload's
+    URL is the uploaded file's URL.
+    """
+    session = get_session(uploader['endpoint'])
+    headers = {
+        'Authorization': f"Bearer {uploader['api']}",
+        'Tus-Resumable': '1.0.0'
+    }
+    metadata = "filename " + base64.b64encode(file_name.encode()).decode()
+    
+    async with session.post(
+        uploader['endpoint'],
+        headers=dict(headers, **{'Upload-Length': str(file_size), 'Upload-Metadata': metadata}),
+        timeout=UPLOAD_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        location = response.headers.get('Location')
+    
+    if not location:
+        raise retry.BadResponse("Upload created without a Location")
+    
+    location = urljoin(uploader['endpoint'], location)
+    chunk_size = int(uploader.get('chunk_size', TUS_CHUNK_SIZE))
+    offset = 0
+    buffer = bytearray()
+    
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= chunk_size:
+            offset = await _tus_patch(session, location, headers, buffer, offset)
+            buffer = bytearray()
+    
+    if buffer:
+        offset = await _tus_patch(session, location, headers, buffer, offset)
+    
+    return location
+
+async def _tus_patch(session, location, headers, data, offset):
+    """Send one chunk of a tus upload, resuming from the server's offset after a failure"""
+    start = offset
+    attempt = 0
+    
+    while True:
+        try:
+            async with session.patch(
+                location,
+                headers=dict(headers, **{
+                    'Upload-Offset': str(offset),
+                    'Content-Type': 'application/offset+octet-stream'
+                }),
+                data=memoryview(data)[offset - start:],
+                timeout=FILE_UPLOAD_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                offset = int(response.headers.get('Upload-Offset', -1))
+        except Exception as e:
+            delay = retry.next_delay(e, attempt, idempotent=True)
+            if delay is None:
+                raise
             
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Upload to {uploader['name']} failed: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Error uploading to {uploader['name']}: {e}")
-        return None
+            await asyncio.sleep(delay)
+            attempt += 1
+            
+            # Ask how much of the chunk arrived and send only the rest
+            async with session.head(location, headers=headers, timeout=UPLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                offset = int(response.headers.get('Upload-Offset', -1))
+        
+        if not start <= offset <= start + len(data):
+            raise retry.BadResponse(f"Unexpected upload offset {offset}")
+        
+        if offset == start + len(data):
+            return offset
 
-def upload_to_platforms(file_url):
-    """Upload file to all active platforms and shorten their URLs"""
+async def _shorten_original(file_url, deadline, quorum, late):
+    """Shorten the original link as its own pipeline stage"""
+    shortened = journal.completed('original')
+    
+    if shortened is None:
+        shortened = await shorten_urls(file_url, quorum, deadline, late)
+        journal.record('original', shortened)
+    
+    return {
+        'stage': 'original',
+        'url': file_url,
+        'shortened': shortened
+    }
+
+async def _upload_and_shorten(index, uploader, file_url, upload_deadline=None, deadline=None,
+                              quorum=0, late=None):
+    """Upload to one platform and shorten the resulting URL as soon as it is ready"""
+    record = {
+        'stage': 'upload',
+        'index': index,
+        'platform': uploader['name'],
+        'url': None,
+        'shortened': []
+    }
+    
+    # A resumed job skips the steps it finished before the restart
+    uploaded_url = journal.completed(f"upload:{uploader['name']}")
+    
+    if uploaded_url is None:
+        try:
+            uploaded_url = await asyncio.wait_for(
+                upload_to_platform(uploader, file_url),
+                _remaining(upload_deadline)
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Skipping {uploader['name']} - upload missed its deadline")
+            return record
+        
+        if not uploaded_url:
+            logger.warning(f"Skipping {uploader['name']} - upload failed")
+            return record
+        
+        journal.record(f"upload:{uploader['name']}", uploaded_url)
+    
+    # Shorten the uploaded URL
+    record['url'] = uploaded_url
+    record['shortened'] = journal.completed(f"shortened:{uploader['name']}")
+    
+    if record['shortened'] is None:
+        record['shortened'] = await shorten_urls(uploaded_url, quorum, deadline, late)
+        journal.record(f"shortened:{uploader['name']}", record['shortened'])
+    
+    return record
+
+async def stream_results(file_url, deadline=None, quorum=0, late=None):
+    """
+    Run the upload and shortening stages as a pipeline and yield records as they finish.
+    
+    The original link is shortened from the start, alongside the uploads, and every
+    uploaded URL moves on to the shorteners without waiting for slower platforms.
+    Each record is a dict with a 'stage' of either 'original' or 'upload'; upload
+    records carry the uploader 'index', 'platform', 'url' (None if the upload failed)
+    and 'shortened' list.
+    
+    With a `deadline`, uploads get UPLOAD_STAGE_SHARE of the remaining time and
+    shortening may run until the deadline itself. `quorum` and `late` are passed
+    on to shorten_urls.
+    """
+    uploaders = get_active_uploaders()
+    
+    # Every provider call made for this request draws on one retry budget
+    retry.new_budget()
+    
+    upload_deadline = None
+    if deadline is not None:
+        upload_deadline = deadline_in(_remaining(deadline) * UPLOAD_STAGE_SHARE) or deadline
+    
+    tasks = [asyncio.ensure_future(_shorten_original(file_url, deadline, quorum, late))]
+    tasks += [
+        asyncio.ensure_future(
+            _upload_and_shorten(i, uploader, file_url, upload_deadline, deadline, quorum, late)
+        )
+        for i, uploader in enumerate(uploaders)
+    ]
+    
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding work if the consumer stops early
+        for task in tasks:
+            task.cancel()
+
+async def _upload_file_and_shorten(index, uploader, fanout, file_name, file_size):
+    """Stream a file to one platform and shorten the resulting URL"""
+    record = {
+        'stage': 'upload',
+        'index': index,
+        'platform': uploader['name'],
+        'url': None,
+        'shortened': []
+    }
+    
+    try:
+        uploaded_url = await upload_file_to_platform(uploader, fanout.read(index), file_name, file_size)
+    finally:
+        # A skipped or failed upload must not hold back the download for the others
+        fanout.detach(index)
+    
+    if not uploaded_url:
+        logger.warning(f"Skipping {uploader['name']} - file upload failed")
+        return record
+    
+    record['url'] = uploaded_url
+    record['shortened'] = await shorten_urls(uploaded_url)
+    
+    return record
+
+def _log_download(task):
+    """Log a failed file download"""
+    if not task.cancelled() and task.exception():
+        logger.error(f"File download failed: {retry.describe(task.exception())}")
+
+async def stream_file_results(file_url, file_name, file_size):
+    """
+    Download a file once and stream it to every active uploader, yielding upload records as they finish.
+    
+    Chunks are fanned out to the uploads as they arrive, so neither memory nor disk
+    ever holds the whole file. Records are the same as stream_results' upload records.
+    """
+    uploaders = get_active_uploaders()
+    
+    if not uploaders:
+        return
+    
+    retry.new_budget()
+    
+    fanout = FanOut(len(uploaders))
+    pump = asyncio.ensure_future(fanout.pump(download_chunks(file_url)))
+    pump.add_done_callback(_log_download)
+    
+    tasks = [
+        asyncio.ensure_future(_upload_file_and_shorten(i, uploader, fanout, file_name, file_size))
+        for i, uploader in enumerate(uploaders)
+    ]
+    
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks + [pump]:
+            task.cancel()
+
+async def collect_file_results(file_url, file_name, file_size, on_record=None):
+    """Stream a file to every platform, returning the successful uploads in platform order"""
+    upload_results = []
+    
+    async for record in stream_file_results(file_url, file_name, file_size):
+        if on_record:
+            on_record(record)
+        
+        if record['url']:
+            upload_results.append(record)
+    
+    upload_results.sort(key=lambda record: record['index'])
+    
+    return upload_results
+
+async def upload_to_platforms(file_url):
+    """Upload file to all active platforms concurrently and shorten their URLs"""
     uploaders = get_active_uploaders()
     
     if not uploaders:
         return []
     
-    results = []
+    tasks = [_upload_and_shorten(i, u, file_url) for i, u in enumerate(uploaders)]
+    results = await asyncio.gather(*tasks)
+    
+    return [result for result in results if result['url']]
+
+async def collect_results(file_url, deadline=None, quorum=0, late=None, on_record=None):
+    """
+    Run the pipeline to completion, returning (original shortened links, successful uploads).
+    
+    `on_record`, if given, is called with each record as it finishes.
+    """
+    original_shortened = []
+    upload_results = []
     
-    for uploader in uploaders:
-        uploaded_url = upload_to_platform(uploader, file_url)
+    async for record in stream_results(file_url, deadline, quorum, late):
+        if on_record:
+            on_record(record)
         
-        if uploaded_url:
-            # Shorten the uploaded URL
-            shortened_urls = shorten_urls(uploaded_url)
-            
-            results.append({
-                'platform': uploader['name'],
-                'url': uploaded_url,
-                'shortened': shortened_urls
-            })
-        else:
-            logger.warning(f"Skipping {uploader['name']} - upload failed")
+        if record['stage'] == 'original':
+            original_shortened = record['shortened']
+        elif record['url']:
+            upload_results.append(record)
+    
+    # Keep the configured platform order
+    upload_results.sort(key=lambda record: record['index'])
+    
+    return original_shortened, upload_results
+
+async def _collect_one(link, canonical):
+    """Check and process one batch link once a batch slot is free"""
+    async with _batch_slots:
+        # Each link runs in a task of its own, so its calls are collected apart
+        calls = record_calls()
+        
+        problem = await preflight.check(canonical)
+        if problem:
+            return link, [], [], problem, calls
+        
+        return (link, *await collect_results(link), None, calls)
+
+async def collect_batch(links):
+    """
+    Process many links, given as (link as sent, canonical link) pairs, with
+    bounded concurrency. The canonical link is only used for the link check.
     
-    return results
\ No newline at end of file
+    Returns (link as sent, original shortened links, successful uploads, preflight problem,
+    provider calls) tuples in the order of `links`.
+    """
+    return await asyncio.gather(*(_collect_one(link, canonical) for link, canonical in links))
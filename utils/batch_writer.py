@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BatchWriter:
+    """
+    Buffer items in memory and hand them to a flush function in batches.
+    
+    Once started, a background task flushes every `max_batch` items or every
+    `interval` seconds, whichever comes first, running `flush_fn(batch)` in a
+    worker thread so disk I/O stays off the event loop. Before `start()` (or
+    after `stop()`) items are flushed synchronously as they are added.
+    """
+    
+    def __init__(self, flush_fn, max_batch=100, interval=0.5, name='batch'):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.interval = interval
+        self.name = name
+        self._buffer = []
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+    
+    def add(self, item):
+        """Queue an item for writing"""
+        self._buffer.append(item)
+        
+        if self._task is None:
+            self._flush_sync()
+        elif len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+    
+    def pending(self):
+        """Number of items waiting to be written"""
+        return len(self._buffer)
+    
+    def start(self):
+        """Start the background flush task on the running loop"""
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Flush everything still buffered and stop the background task"""
+        if self._task is None:
+            return
+        
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+    
+    async def flush(self):
+        """Write the current buffer now"""
+        if not self._buffer:
+            return
+        
+        batch, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self.flush_fn, batch)
+        except Exception as e:
+            logger.error(f"{self.name} writer failed to flush {len(batch)} item(s): {e}")
+    
+    def _flush_sync(self):
+        """Write the current buffer on the calling thread"""
+        batch, self._buffer = self._buffer, []
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            logger.error(f"{self.name} writer failed to flush {len(batch)} item(s): {e}")
+    
+    async def _run(self):
+        """Flush on size or time until stopped"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            
+            self._wakeup.clear()
+            await self.flush()
+        
+        await self.flush()
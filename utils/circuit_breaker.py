@@ -0,0 +1,125 @@
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Breaker tuning, overridable from .env
+FAILURE_THRESHOLD = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+# Average latency that opens the breaker, per provider kind: about 80% of each kind's
+# request timeout (10s for shorteners, 30s for uploaders)
+LATENCY_THRESHOLDS = {
+    'shortener': float(os.getenv('BREAKER_LATENCY_SHORTENER', os.getenv('BREAKER_LATENCY', '8'))),
+    'uploader': float(os.getenv('BREAKER_LATENCY_UPLOADER', '24'))
+}
+MIN_SAMPLES = int(os.getenv('BREAKER_MIN_SAMPLES', '5'))
+OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one provider.
+    
+    Failure rate and latency are tracked as exponentially weighted moving
+    averages. Once enough samples are in and either crosses its threshold the
+    breaker opens, and requests are skipped without touching the network. After
+    OPEN_SECONDS one request is let through as a probe: success closes the
+    breaker, failure opens it again.
+    """
+    
+    def __init__(self, latency_threshold):
+        self.latency_threshold = latency_threshold
+        self.state = CLOSED
+        self.failure_rate = 0.0
+        self.latency = 0.0
+        self.samples = 0
+        self.opened_at = 0.0
+        self._probing = False
+    
+    def allow(self):
+        """Check if a request may go through now"""
+        if self.state == CLOSED:
+            return True
+        
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < OPEN_SECONDS:
+                return False
+            self.state = HALF_OPEN
+            self._probing = False
+        
+        # Half-open: a single probe at a time
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+    
+    def record(self, success, latency=None):
+        """Record the outcome of a request that was allowed through; None leaves the latency alone"""
+        self.samples += 1
+        self.failure_rate += EWMA_ALPHA * ((0.0 if success else 1.0) - self.failure_rate)
+        if latency is not None:
+            self.latency += EWMA_ALPHA * (latency - self.latency)
+        
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if success:
+                self._close()
+            else:
+                self._open()
+            return
+        
+        if self.state == CLOSED and self.samples >= MIN_SAMPLES:
+            if self.failure_rate >= FAILURE_THRESHOLD or self.latency >= self.latency_threshold:
+                self._open()
+    
+    def cancel_probe(self):
+        """Give up a probe slot without an outcome"""
+        self._probing = False
+    
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+    
+    def _close(self):
+        # Start the averages afresh so the old failures don't re-open it at once
+        self.state = CLOSED
+        self.failure_rate = 0.0
+        self.latency = 0.0
+        self.samples = 0
+
+# Live breakers: (kind, name) -> CircuitBreaker
+_breakers = {}
+
+def get_breaker(kind, entry):
+    """Get the breaker for a shortener or uploader entry"""
+    key = (kind, entry['name'])
+    
+    if key not in _breakers:
+        _breakers[key] = CircuitBreaker(LATENCY_THRESHOLDS[kind])
+    
+    return _breakers[key]
+
+def health_score(breaker):
+    """Score a provider's health from 0 (dead) to 100 (healthy)"""
+    if breaker.state == OPEN:
+        return 0
+    
+    slowness = min(1.0, breaker.latency / breaker.latency_threshold)
+    return round(100 * (1 - breaker.failure_rate) * (1 - 0.5 * slowness))
+
+def describe(kind, entry):
+    """Describe a provider's breaker state for listings"""
+    breaker = get_breaker(kind, entry)
+    
+    if breaker.state == OPEN:
+        retry_in = max(0, OPEN_SECONDS - (time.monotonic() - breaker.opened_at))
+        return f"🔴 open, retry in {retry_in:.0f}s"
+    if breaker.state == HALF_OPEN:
+        return "🟡 half-open"
+    return f"🟢 health {health_score(breaker)}%"
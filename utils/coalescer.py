@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Result cache limits, overridable from .env
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', '600'))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1000'))
+
+# Jobs currently running: key -> future shared by every caller
+_inflight = {}
+
+# Finished results: key -> (value, expires at)
+_results = OrderedDict()
+
+async def run_once(key, factory):
+    """
+    Run factory() once per key at a time.
+    
+    Callers that arrive while a job for the same key is running attach to it
+    and receive its result instead of starting their own.
+    """
+    future = _inflight.get(key)
+    
+    if future is None:
+        future = asyncio.ensure_future(factory())
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # One caller giving up must not cancel the job for everyone else
+    return await asyncio.shield(future)
+
+def get_result(key):
+    """Get a cached result, or None if missing or expired"""
+    entry = _results.get(key)
+    
+    if entry is None:
+        return None
+    
+    if entry[1] <= time.monotonic():
+        del _results[key]
+        return None
+    
+    _results.move_to_end(key)
+    return entry[0]
+
+def put_result(key, value):
+    """Cache a result for RESULT_CACHE_TTL seconds"""
+    _results[key] = (value, time.monotonic() + RESULT_CACHE_TTL)
+    _results.move_to_end(key)
+    
+    while len(_results) > RESULT_CACHE_MAX_ENTRIES:
+        _results.popitem(last=False)
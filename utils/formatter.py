@@ -1,4 +1,7 @@
+import bisect
 import json
+from datetime import datetime
+from utils import metrics
 
 def format_result(original_link, original_shortened, upload_results):
     """
@@ -11,33 +14,250 @@ def format_result(original_link, original_shortened, upload_results):
     File Press Shortner Link - ["shortner1","shortner2"]
     """
     
-    result = ""
-    
     # Format original link section
-    result += f"Drive link - {original_link}\n"
+    sections = [format_original_section(original_link, original_shortened)]
     
-    if original_shortened:
-        shortened_json = json.dumps(original_shortened)
-        result += f"Drive Shortner Link - {shortened_json}\n"
-    else:
-        result += "Drive Shortner Link - []\n"
+    # Format each upload platform section
+    sections += [format_upload_section(upload) for upload in upload_results]
     
-    result += "\n"
+    return "\n\n".join(sections).strip()
+
+def format_file_result(file_name, upload_results):
+    """Format the result of a file sent to the bot, like format_result without the Drive link"""
+    sections = [format_file_section(file_name)]
+    sections += [format_upload_section(upload) for upload in upload_results]
     
-    # Format each upload platform section
-    for upload in upload_results:
-        platform_name = upload['platform']
-        platform_url = upload['url']
-        platform_shortened = upload['shortened']
-        
-        result += f"{platform_name} - {platform_url}\n"
+    return "\n\n".join(sections).strip()
+
+def format_file_section(file_name):
+    """Format the header of a file result"""
+    return f"File - {file_name}"
+
+def format_original_section(original_link, original_shortened):
+    """Format the Drive link section of a result"""
+    return _format_section("Drive link", original_link, "Drive", original_shortened)
+
+def format_upload_section(upload):
+    """Format one upload platform's section of a result"""
+    return _format_section(upload['platform'], upload['url'], upload['platform'], upload['shortened'])
+
+def _format_section(title, url, shortener_title, shortened):
+    """Format a link line and its shortened links line"""
+    return f"{title} - {url}\n{shortener_title} Shortner Link - {json.dumps(shortened or [])}"
+
+class IncrementalResult:
+    """
+    Build format_result's text as pipeline records arrive.
+    
+    Each section is rendered once, when its record is added, so the text can be
+    re-sent after every finished platform without rebuilding finished sections.
+    With a `file_name`, the text follows format_file_result instead.
+    """
+    
+    def __init__(self, original_link, file_name=None):
+        self.original_link = original_link
+        self.uploads = 0
         
-        if platform_shortened:
-            shortened_json = json.dumps(platform_shortened)
-            result += f"{platform_name} Shortner Link - {shortened_json}\n"
+        if file_name is not None:
+            self._original = format_file_section(file_name)
         else:
-            result += f"{platform_name} Shortner Link - []\n"
+            self._original = f"Drive link - {original_link}\nDrive Shortner Link - ⏳"
+        self._sections = []
+        self._text = None
+    
+    def add(self, record):
+        """Add a record from stream_results; failed uploads are left out"""
+        if record['stage'] == 'original':
+            self._original = format_original_section(self.original_link, record['shortened'])
+        elif record['url']:
+            # Keep the configured platform order
+            bisect.insort(self._sections, (record['index'], format_upload_section(record)))
+            self.uploads += 1
+        else:
+            return
+        
+        self._text = None
+    
+    def text(self):
+        """Get the text of the sections added so far"""
+        if self._text is None:
+            sections = [self._original] + [section for _, section in self._sections]
+            self._text = "\n\n".join(sections).strip()
         
-        result += "\n"
+        return self._text
+
+def format_batch_report(results):
+    """
+    Format batch results as a JSON report.
+    
+    Each entry holds the link, its shortened links, the per-platform uploads,
+    the same text /upload would have sent for that link, and the reason the
+    link was rejected, if it was.
+    """
+    report = []
+    
+    for link, original_shortened, upload_results, error, _ in results:
+        report.append({
+            'link': link,
+            'shortened': original_shortened,
+            'uploads': [
+                {
+                    'platform': upload['platform'],
+                    'url': upload['url'],
+                    'shortened': upload['shortened']
+                }
+                for upload in upload_results
+            ],
+            'text': format_result(link, original_shortened, upload_results) if upload_results else None,
+            'error': error
+        })
+    
+    return json.dumps(report, indent=2)
+
+def format_job(job):
+    """Format a job record for /status"""
+    result = f"📋 Job {job['id']}\n"
+    result += f"Status: {job['status'].capitalize()}\n"
+    
+    if job['description']:
+        result += f"Link: {job['description']}\n"
+    
+    queued_at = datetime.fromtimestamp(job['created']).strftime('%H:%M:%S')
+    result += f"Queued at: {queued_at}\n"
+    
+    if job['started']:
+        result += f"Waited: {job['started'] - job['created']:.1f}s\n"
+    
+    if job['finished']:
+        result += f"Took: {job['finished'] - job['started']:.1f}s\n"
+    
+    if job['error']:
+        result += f"Error: {job['error']}\n"
+    
+    return result.strip()
+
+def format_queue_stats(stats, admission=None):
+    """Format job queue statistics, and admission counts if given, for /status"""
+    result = "📊 Job Queue\n"
+    result += f"Queued: {stats['queued']}/{stats['capacity']}\n"
+    result += f"Workers busy: {stats['busy']}/{stats['workers']}\n"
+    result += f"Utilization: {stats['utilization']:.0%}\n"
+    result += f"Average wait: {stats['avg_wait']:.1f}s"
+    
+    if admission:
+        result += f"\nIn flight: {admission['inflight']}/{admission['inflight_limit'] or '∞'}"
+        result += f"\nUsers with quotas: {admission['users']}"
+    
+    return result
+
+def _percentiles(data):
+    """Format p50/p95/p99 of histogram data"""
+    p50, p95, p99 = (metrics.quantile(data, q) for q in (0.5, 0.95, 0.99))
+    return f"p50 {p50:.2f}s · p95 {p95:.2f}s · p99 {p99:.2f}s"
+
+def format_stats():
+    """Format a compact metrics summary for /stats"""
+    requests = metrics.counters('provider_requests_total')
+    latencies = metrics.histograms('provider_latency_seconds')
+    transferred = metrics.counters('provider_bytes_total')
+    
+    result = "📈 Provider Stats\n\n"
+    
+    if not latencies:
+        result += "No provider calls yet.\n"
+    
+    for key, data in sorted(latencies.items()):
+        labels = dict(key)
+        
+        # Calls by result for this provider
+        outcomes = {}
+        for request_key, count in requests.items():
+            request_labels = dict(request_key)
+            if request_labels['kind'] == labels['kind'] and request_labels['provider'] == labels['provider']:
+                outcomes[request_labels['result']] = count
+        
+        total = sum(outcomes.values())
+        ok = outcomes.get('ok', 0)
+        errors = ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items()) if name != 'ok')
+        size = transferred.get(key, 0)
+        
+        result += f"{labels['provider']} ({labels['kind']}): {total} calls, {ok / max(total, 1):.0%} ok\n"
+        result += f"  {_percentiles(data)}, {size / 1024:.1f} KB\n"
+        if errors:
+            result += f"  errors: {errors}\n"
+    
+    result += "\n"
+    
+    for name, label in (
+        ('upload_latency_seconds', "/upload end to end"),
+        ('job_queue_wait_seconds', "Queue wait"),
+        ('send_queue_seconds', "Send queue wait"),
+        ('telegram_send_seconds', "Telegram send")
+    ):
+        data = metrics.histograms(name).get(())
+        if data and data[-1]:
+            result += f"{label}: {data[-1]} samples\n  {_percentiles(data)}\n"
+    
+    return result.strip()
+
+def format_slow_requests(traces, spans_shown=6):
+    """Format the slowest spans of recent slow requests for /slow"""
+    if not traces:
+        return "🐢 No slow requests recorded."
+    
+    result = "🐢 Slow Requests\n"
+    
+    for trace in traces:
+        when = datetime.fromtimestamp(trace['start']).strftime('%Y-%m-%d %H:%M:%S')
+        subject = trace['attrs'].get('link', trace['name'])
+        outcome = trace['attrs'].get('outcome', '')
+        
+        result += f"\n{trace['duration']:.1f}s · {when} · {outcome}\n{subject}\n"
+        
+        for span in sorted(trace['spans'], key=lambda s: s['duration'], reverse=True)[:spans_shown]:
+            provider = span['attrs'].get('provider')
+            name = f"{span['name']} {provider}" if provider else span['name']
+            error = f" ⚠️ {span['attrs']['error']}" if 'error' in span['attrs'] else ""
+            result += f"  {name}: {span['duration']:.2f}s (at +{span['start']:.2f}s){error}\n"
+    
+    # Keep within Telegram's message length
+    return result.strip()[:4096]
+
+def format_history(user_id, history):
+    """Format a user's upload history for /history"""
+    result = f"🗂 Upload History ({user_id})\n\n"
+    result += f"Today: {history['today']} · Last 7 days: {history['week']} · Total: {history['total']}\n"
+    
+    if not history['recent']:
+        return result + "\nNo uploads yet."
+    
+    result += "\nRecent:\n"
+    for link, timestamp in history['recent']:
+        result += f"{timestamp[:16].replace('T', ' ')} · {link}\n"
+    
+    return result.strip()[:4096]
+
+def format_top_stats(stats):
+    """Format top users, links and providers for /topstats"""
+    result = f"🏆 Top Stats (last {stats['days']} days, UTC)\n\n"
+    result += f"Uploads: {stats['last_day']} in the last 24h · {stats['period']} in the period\n"
+    
+    if stats['users']:
+        result += "\nTop users:\n"
+        for i, (user_id, user, count) in enumerate(stats['users'], 1):
+            result += f"{i}. @{user} ({user_id}): {count}\n"
+    
+    if stats['links']:
+        result += "\nTop links:\n"
+        for i, (link, count) in enumerate(stats['links'], 1):
+            result += f"{i}. {link}: {count}\n"
+    
+    if stats['providers']:
+        result += "\nProviders:\n"
+        for kind, provider, calls, seconds, failed in stats['providers']:
+            result += (
+                f"{provider} ({kind}): {calls} calls, {1 - failed / max(calls, 1):.0%} ok, "
+                f"avg {seconds / max(calls, 1):.2f}s\n"
+            )
     
-    return result.strip()
\ No newline at end of file
+    return result.strip()[:4096]
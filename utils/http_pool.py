@@ -0,0 +1,193 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from dotenv import load_dotenv
+from utils.shortener_manager import load_shorteners
+from utils.uploader_manager import load_uploaders
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool tuning, overridable from .env
+POOL_SIZE_PER_HOST = int(os.getenv('POOL_SIZE_PER_HOST', '10'))
+KEEPALIVE_TIMEOUT = float(os.getenv('POOL_KEEPALIVE_TIMEOUT', '60'))
+DNS_CACHE_TTL = int(os.getenv('DNS_CACHE_TTL', '300'))
+
+WARMUP_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# Connections of the shared session, for hosts that are not providers
+SHARED_POOL_SIZE = int(os.getenv('SHARED_POOL_SIZE', '20'))
+
+# One keep-alive session per provider host, keyed by "scheme://host:port"
+_pools = {}
+
+# One bounded session for every other host, for checking links users send
+_shared = None
+
+# One session for downloading sent files from the Telegram Bot API
+_bot_api = None
+
+def host_key(url):
+    """Get the pool key (scheme and host) for a URL"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+def _new_session():
+    """Create a session with a bounded, keep-alive connection pool and DNS cache"""
+    connector = aiohttp.TCPConnector(
+        limit=POOL_SIZE_PER_HOST,
+        limit_per_host=POOL_SIZE_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+class BlockedAddress(OSError):
+    """Raised for hosts on loopback, private, link-local or other non-public addresses"""
+
+def is_public_address(address):
+    """Check if an IP address is on the public internet"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    
+    # IPv4 addresses written as IPv6 (::ffff:127.0.0.1) are judged as IPv4
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    
+    return ip.is_global and not ip.is_multicast
+
+def is_public_url(url):
+    """
+    Check that a URL is http(s) and doesn't name a non-public IP address.
+    
+    Host names pass; the shared session's resolver checks what they resolve to.
+    """
+    parts = urlsplit(url)
+    
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return False
+    
+    try:
+        return is_public_address(parts.hostname)
+    except ValueError:
+        return True
+
+class _PublicResolver(AbstractResolver):
+    """Resolve host names to their public addresses only, at connect time"""
+    
+    def __init__(self):
+        self._resolver = DefaultResolver()
+    
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        addresses = [a for a in await self._resolver.resolve(host, port, family) if is_public_address(a['host'])]
+        
+        if not addresses:
+            raise BlockedAddress(f"{host} does not resolve to a public address")
+        
+        return addresses
+    
+    async def close(self):
+        await self._resolver.close()
+
+def get_shared_session():
+    """
+    Get the session for hosts that are not providers, opening it on first use.
+    
+    Users choose these hosts, so they share one bounded pool instead of each
+    getting a pool of its own, sync_pools never closes it, and it only
+    connects to public addresses.
+    """
+    global _shared
+    
+    if _shared is None or _shared.closed:
+        connector = aiohttp.TCPConnector(
+            limit=SHARED_POOL_SIZE,
+            limit_per_host=POOL_SIZE_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            resolver=_PublicResolver()
+        )
+        _shared = aiohttp.ClientSession(connector=connector)
+    
+    return _shared
+
+def get_bot_api_session():
+    """
+    Get the session for downloading sent files, opening it on first use.
+    
+    The bot's own Bot API server is trusted, so unlike the shared session this
+    one may connect to a local Bot API server on a loopback or private address.
+    """
+    global _bot_api
+    
+    if _bot_api is None or _bot_api.closed:
+        _bot_api = _new_session()
+    
+    return _bot_api
+
+def get_session(url):
+    """Get the pooled session for the host of a provider URL, opening it on first use"""
+    key = host_key(url)
+    session = _pools.get(key)
+    
+    if session is None or session.closed:
+        session = _new_session()
+        _pools[key] = session
+    
+    return session
+
+async def _warm_up_host(key):
+    """Resolve and pre-connect to a host so the first real request skips the handshake"""
+    try:
+        async with get_session(key).head(key, timeout=WARMUP_TIMEOUT, allow_redirects=False):
+            pass
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"Warm-up of {key} failed: {e!r}")
+
+async def close_pool(key):
+    """Close the pool for a host"""
+    session = _pools.pop(key, None)
+    
+    if session is not None and not session.closed:
+        await session.close()
+
+def provider_hosts():
+    """Get the pool keys of every configured shortener and uploader"""
+    urls = [s['base'] for s in load_shorteners()]
+    urls += [u['endpoint'] for u in load_uploaders()]
+    
+    return {host_key(url) for url in urls}
+
+async def sync_pools():
+    """Open pools for newly configured provider hosts and close pools no longer in use"""
+    wanted = provider_hosts()
+    
+    for key in list(_pools):
+        if key not in wanted:
+            await close_pool(key)
+    
+    new_hosts = [key for key in wanted if key not in _pools]
+    await asyncio.gather(*(_warm_up_host(key) for key in new_hosts))
+    
+    if new_hosts:
+        logger.info(f"Opened connection pools for {len(new_hosts)} provider host(s)")
+
+async def close_all():
+    """Close every pool, the shared session and the Bot API session"""
+    global _shared, _bot_api
+    
+    for key in list(_pools):
+        await close_pool(key)
+    
+    for session in (_shared, _bot_api):
+        if session is not None and not session.closed:
+            await session.close()
+    _shared = _bot_api = None
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import aiohttp
+from dotenv import load_dotenv
+from utils.http_pool import get_bot_api_session
+from utils import metrics, retry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Streaming tuning, overridable from .env: bytes per chunk, and chunks buffered per
+# uploader, so a file job holds at most INGEST_CHUNK_SIZE * INGEST_QUEUE_CHUNKS per uploader
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', str(256 * 1024)))
+INGEST_QUEUE_CHUNKS = int(os.getenv('INGEST_QUEUE_CHUNKS', '8'))
+
+# No overall limit for a download, only for stalls
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+
+# Queue markers
+_EOF = object()
+
+class SourceError(Exception):
+    """Raised to uploaders when the download they read from fails"""
+
+async def download_chunks(file_url):
+    """Stream a sent file from the Bot API in INGEST_CHUNK_SIZE chunks without holding it in memory"""
+    async with get_bot_api_session().get(file_url, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        
+        async for chunk in response.content.iter_chunked(INGEST_CHUNK_SIZE):
+            metrics.inc('ingest_bytes_total', len(chunk))
+            yield chunk
+
+class FanOut:
+    """
+    Tee one stream of chunks to several readers.
+    
+    Every reader gets the same bytes objects, through its own queue of at most
+    `max_chunks` chunks; the source is only read as fast as the slowest reader
+    takes chunks, which bounds memory. A reader that stops early is detached so
+    it no longer holds the others back.
+    """
+    
+    def __init__(self, readers, max_chunks=INGEST_QUEUE_CHUNKS):
+        self._queues = [asyncio.Queue(max_chunks) for _ in range(readers)]
+        self._detached = set()
+    
+    async def pump(self, chunks):
+        """Read the source to the end, handing every chunk to every attached reader"""
+        try:
+            async for chunk in chunks:
+                for i, queue in enumerate(self._queues):
+                    if i not in self._detached:
+                        await queue.put(chunk)
+                
+                if len(self._detached) == len(self._queues):
+                    logger.warning("Every upload stopped, abandoning the download")
+                    return
+        except BaseException as e:
+            # Fail the readers straight away; what they have queued is no use to them now.
+            # The file URL holds the bot token, so only the error's description is passed on
+            if isinstance(e, Exception):
+                error = SourceError(f"Download failed: {retry.describe(e)}")
+            else:
+                error = SourceError("Download cancelled")
+            for i, queue in enumerate(self._queues):
+                if i not in self._detached:
+                    _drain(queue)
+                    queue.put_nowait(error)
+            raise
+        
+        # Readers take the end marker after the chunks queued before it
+        for i, queue in enumerate(self._queues):
+            if i not in self._detached:
+                await queue.put(_EOF)
+    
+    async def read(self, i):
+        """Yield reader `i`'s chunks; stopping early detaches the reader"""
+        queue = self._queues[i]
+        
+        try:
+            while True:
+                chunk = await queue.get()
+                
+                if chunk is _EOF:
+                    return
+                if isinstance(chunk, SourceError):
+                    raise chunk
+                
+                yield chunk
+        finally:
+            self.detach(i)
+    
+    def detach(self, i):
+        """Stop feeding reader `i`, freeing anything queued for it"""
+        self._detached.add(i)
+        _drain(self._queues[i])
+
+def _drain(queue):
+    """Empty a queue without waiting"""
+    while not queue.empty():
+        queue.get_nowait()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Queue sizing, overridable from .env
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '100'))
+JOB_QUEUE_PER_USER = int(os.getenv('JOB_QUEUE_PER_USER', '5'))
+JOB_HISTORY_SIZE = int(os.getenv('JOB_HISTORY_SIZE', '1000'))
+
+class QueueFull(Exception):
+    """Raised when a job cannot be queued"""
+
+# Priority jobs are served first, then one job per user in turn
+_priority = deque()
+_user_queues = OrderedDict()
+_queued = 0
+_available = asyncio.Semaphore(0)
+
+# Every known job by id, oldest first
+_jobs = OrderedDict()
+
+_workers = []
+_busy = 0
+_busy_seconds = 0.0
+_started_at = None
+_avg_wait = 0.0
+
+def submit(user_id, run, description='', priority=False):
+    """
+    Queue a job and return its record.
+    
+    `run` is an async function called with the job record once a worker picks
+    it up. Raises QueueFull if the queue, or the user's share of it, is full.
+    """
+    global _queued
+    
+    if _queued >= JOB_QUEUE_SIZE:
+        raise QueueFull("The job queue is full.")
+    
+    user_queue = _user_queues.get(user_id)
+    if not priority and user_queue and len(user_queue) >= JOB_QUEUE_PER_USER:
+        raise QueueFull("You already have too many jobs waiting.")
+    
+    job = {
+        'id': uuid.uuid4().hex[:8],
+        'user_id': user_id,
+        'description': description,
+        'status': 'queued',
+        'created': time.time(),
+        'started': None,
+        'finished': None,
+        'error': None,
+        'run': run
+    }
+    
+    if priority:
+        _priority.append(job)
+    else:
+        _user_queues.setdefault(user_id, deque()).append(job)
+    
+    _queued += 1
+    metrics.set_gauge('job_queue_depth', _queued)
+    _remember(job)
+    _available.release()
+    
+    return job
+
+def _remember(job):
+    """Track a job, forgetting the oldest finished ones beyond the history size"""
+    _jobs[job['id']] = job
+    
+    while len(_jobs) > JOB_HISTORY_SIZE:
+        oldest = next(iter(_jobs.values()))
+        if oldest['status'] in ('queued', 'running'):
+            break
+        _jobs.popitem(last=False)
+
+def _next_job():
+    """Take the next job: priority first, then round-robin across users"""
+    global _queued
+    
+    _queued -= 1
+    metrics.set_gauge('job_queue_depth', _queued)
+    
+    if _priority:
+        return _priority.popleft()
+    
+    user_id, user_queue = _user_queues.popitem(last=False)
+    job = user_queue.popleft()
+    
+    # Users with more work go to the back of the line
+    if user_queue:
+        _user_queues[user_id] = user_queue
+    
+    return job
+
+async def _worker():
+    """Run queued jobs forever"""
+    global _busy, _busy_seconds, _avg_wait
+    
+    while True:
+        await _available.acquire()
+        job = _next_job()
+        
+        job['status'] = 'running'
+        job['started'] = time.time()
+        wait = job['started'] - job['created']
+        _avg_wait += 0.1 * (wait - _avg_wait)
+        _busy += 1
+        metrics.observe('job_queue_wait_seconds', wait)
+        metrics.set_gauge('job_workers_busy', _busy)
+        
+        try:
+            # In a task of its own, so context a job sets (its journal binding) ends with it
+            await asyncio.create_task(job['run'](job))
+            job['status'] = 'done'
+        except asyncio.CancelledError:
+            job['status'] = 'cancelled'
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            _busy -= 1
+            metrics.set_gauge('job_workers_busy', _busy)
+            job['finished'] = time.time()
+            _busy_seconds += job['finished'] - job['started']
+            # The callable may hold on to large objects
+            job['run'] = None
+
+def start_workers(count=JOB_WORKERS):
+    """Start the worker pool on the running loop"""
+    global _started_at
+    
+    _started_at = time.time()
+    for _ in range(count):
+        _workers.append(asyncio.create_task(_worker()))
+    
+    metrics.set_gauge('job_workers', len(_workers))
+
+async def stop_workers():
+    """Cancel the worker pool"""
+    for task in _workers:
+        task.cancel()
+    
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+def get_job(job_id):
+    """Get a job record by id, or None"""
+    return _jobs.get(job_id)
+
+def stats():
+    """Get queue depth and worker utilization"""
+    elapsed = time.time() - _started_at if _started_at else 0
+    workers = len(_workers)
+    
+    return {
+        'queued': _queued,
+        'capacity': JOB_QUEUE_SIZE,
+        'workers': workers,
+        'busy': _busy,
+        'utilization': _busy_seconds / (elapsed * workers) if elapsed and workers else 0.0,
+        'avg_wait': _avg_wait
+    }
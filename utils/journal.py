@@ -0,0 +1,129 @@
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from utils.batch_writer import BatchWriter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DB = 'journal.db'
+
+# Batching, overridable from .env
+JOURNAL_BATCH_SIZE = int(os.getenv('JOURNAL_BATCH_SIZE', '100'))
+JOURNAL_FLUSH_MS = int(os.getenv('JOURNAL_FLUSH_MS', '200'))
+
+# Unfinished jobs older than this are dropped instead of resumed, overridable from .env
+JOURNAL_MAX_AGE = int(os.getenv('JOURNAL_MAX_AGE', str(24 * 3600)))
+
+_conn = None
+_conn_lock = threading.Lock()
+
+# The running job's id and finished steps, seen by every task the job starts
+_current = contextvars.ContextVar('journal_job', default=None)
+
+def _connect():
+    """Open the journal database, creating the tables on first use"""
+    global _conn
+    
+    if _conn is None:
+        _conn = sqlite3.connect(JOURNAL_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS steps ("
+            "job_id TEXT NOT NULL, step TEXT NOT NULL, result TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, step))"
+        )
+        _conn.commit()
+    
+    return _conn
+
+def _write_ops(ops):
+    """Apply a batch of journal writes, in order, in one transaction"""
+    with _conn_lock:
+        conn = _connect()
+        with conn:
+            for op, *args in ops:
+                if op == 'job':
+                    conn.execute("INSERT OR REPLACE INTO jobs (id, kind, data, created) VALUES (?, ?, ?, ?)", args)
+                elif op == 'step':
+                    conn.execute("INSERT OR REPLACE INTO steps (job_id, step, result) VALUES (?, ?, ?)", args)
+                elif op == 'done':
+                    conn.execute("DELETE FROM steps WHERE job_id = ?", args)
+                    conn.execute("DELETE FROM jobs WHERE id = ?", args)
+
+_writer = BatchWriter(
+    _write_ops,
+    max_batch=JOURNAL_BATCH_SIZE,
+    interval=JOURNAL_FLUSH_MS / 1000,
+    name='Job journal'
+)
+
+async def start_journal():
+    """Start batching journal writes"""
+    _writer.start()
+
+async def stop_journal():
+    """Flush pending journal writes and stop the writer"""
+    await _writer.stop()
+
+def add_job(job_id, kind, data):
+    """Record a new job with everything needed to run it again (`data` must be JSON-serializable)"""
+    _writer.add(('job', job_id, kind, json.dumps(data), time.time()))
+
+def finish_job(job_id):
+    """Forget a job that finished, for better or worse"""
+    _writer.add(('done', job_id))
+
+def unfinished_jobs():
+    """
+    Load the jobs a previous run left unfinished, oldest first.
+    
+    Returns (job id, kind, data, finished steps) tuples. Jobs older than
+    JOURNAL_MAX_AGE are dropped.
+    """
+    with _conn_lock:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM steps WHERE job_id IN (SELECT id FROM jobs WHERE created < ?)",
+                         (time.time() - JOURNAL_MAX_AGE,))
+            conn.execute("DELETE FROM jobs WHERE created < ?", (time.time() - JOURNAL_MAX_AGE,))
+        
+        jobs = conn.execute("SELECT id, kind, data FROM jobs ORDER BY created").fetchall()
+        steps = conn.execute("SELECT job_id, step, result FROM steps").fetchall()
+    
+    done = {}
+    for job_id, step, result in steps:
+        done.setdefault(job_id, {})[step] = json.loads(result)
+    
+    return [(job_id, kind, json.loads(data), done.get(job_id, {})) for job_id, kind, data in jobs]
+
+def bind(job_id, steps=None):
+    """Journal the steps of the current task, and the tasks it starts, under a job"""
+    _current.set({'id': job_id, 'steps': dict(steps or {})})
+
+def completed(step):
+    """Get the result of a step the current job already finished, or None"""
+    job = _current.get()
+    return job['steps'].get(step) if job else None
+
+def record(step, result):
+    """Record a finished step of the current job, if there is one"""
+    job = _current.get()
+    
+    if job is None:
+        return
+    
+    job['steps'][step] = result
+    _writer.add(('step', job['id'], step, json.dumps(result)))
@@ -0,0 +1,160 @@
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from utils import retry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds a key is retired after an auth or quota error, or after a rate limit
+# without Retry-After, overridable from .env
+KEY_RETIRE_SECONDS = float(os.getenv('KEY_RETIRE_SECONDS', '600'))
+KEY_RATE_LIMIT_SECONDS = float(os.getenv('KEY_RATE_LIMIT_SECONDS', '60'))
+
+# Statuses that mean the key itself is unusable: rejected, or out of quota
+AUTH_STATUSES = (401, 403)
+QUOTA_STATUSES = (402,)
+
+def api_keys(entry):
+    """
+    Get a provider's API keys as (key, weight) pairs.
+    
+    'api' holds the first key and an optional 'keys' list the rest, each either
+    a key string or {"api": ..., "weight": ...}.
+    """
+    keys = [(entry['api'], float(entry.get('weight', 1)))]
+    
+    for extra in entry.get('keys', []):
+        if isinstance(extra, dict):
+            keys.append((extra['api'], float(extra.get('weight', 1))))
+        else:
+            keys.append((extra, 1.0))
+    
+    return keys
+
+def retire_seconds(error):
+    """Seconds to retire the key a request failed with, or None if the key is not to blame"""
+    status = getattr(error, 'status', None)
+    
+    if status in AUTH_STATUSES or status in QUOTA_STATUSES:
+        return KEY_RETIRE_SECONDS
+    if status == 429:
+        return retry.retry_after(error) or KEY_RATE_LIMIT_SECONDS
+    
+    return None
+
+def mask(key):
+    """Shorten a key for logs"""
+    return f"{key[:4]}…" if len(key) > 4 else "…"
+
+class KeyPool:
+    """
+    Spread one provider's requests over its API keys.
+    
+    Each request goes to the usable key with the fewest outstanding requests
+    per unit of weight; ties, which is every pick under light load, go by smooth
+    weighted round-robin. A key that fails with an auth, quota or rate limit
+    error is retired until its cooldown ends, unless it is the only key.
+    """
+    
+    def __init__(self):
+        self.keys = {}
+        self._config = None
+    
+    def configure(self, keys):
+        """Apply the configured keys, keeping the state of keys that stay"""
+        if keys == self._config:
+            return
+        
+        current = {}
+        for key, weight in keys:
+            state = self.keys.get(key) or {'outstanding': 0, 'retired_until': 0.0, 'current': 0.0}
+            state['weight'] = max(weight, 0.01)
+            current[key] = state
+        
+        self.keys = current
+        self._config = keys
+    
+    def usable(self):
+        """Keys that are not retired"""
+        now = time.monotonic()
+        return [key for key, state in self.keys.items() if state['retired_until'] <= now]
+    
+    def acquire(self):
+        """Pick a key for a request, or None if every key is retired"""
+        usable = self.usable()
+        
+        if not usable:
+            return None
+        
+        total = 0.0
+        for key in usable:
+            state = self.keys[key]
+            state['current'] += state['weight']
+            total += state['weight']
+        
+        key = min(
+            usable,
+            key=lambda k: (self.keys[k]['outstanding'] / self.keys[k]['weight'], -self.keys[k]['current'])
+        )
+        
+        state = self.keys[key]
+        state['current'] -= total
+        state['outstanding'] += 1
+        
+        return key
+    
+    def release(self, key, error=None):
+        """Finish a request made with a key; returns True if the error retired the key"""
+        state = self.keys.get(key)
+        
+        # The key was removed from the config while the request ran
+        if state is None:
+            return False
+        
+        state['outstanding'] -= 1
+        
+        if error is None or len(self.keys) < 2:
+            return False
+        
+        cooldown = retire_seconds(error)
+        if cooldown is None:
+            return False
+        
+        state['retired_until'] = time.monotonic() + cooldown
+        logger.warning(f"Retired API key {mask(key)} for {cooldown:.0f}s: {retry.describe(error)}")
+        
+        return True
+    
+    def can_fail_over(self, error):
+        """Check if a request that failed because of its key can move on to another key"""
+        return retire_seconds(error) is not None and len(self.keys) > 1 and bool(self.usable())
+
+# Live pools: (kind, name) -> KeyPool
+_pools = {}
+
+def get_pool(kind, entry):
+    """Get the key pool for a shortener or uploader entry"""
+    key = (kind, entry['name'])
+    pool = _pools.get(key)
+    
+    if pool is None:
+        pool = KeyPool()
+        _pools[key] = pool
+    
+    pool.configure(api_keys(entry))
+    
+    return pool
+
+def describe(kind, entry):
+    """Describe a provider's key pool for listings, or '' for a single key"""
+    pool = get_pool(kind, entry)
+    
+    if len(pool.keys) < 2:
+        return ""
+    
+    retired = len(pool.keys) - len(pool.usable())
+    
+    return f"{len(pool.keys)} keys" + (f", {retired} retired" if retired else "")
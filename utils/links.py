@@ -0,0 +1,105 @@
+import re
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+# Google Drive file ids, wherever the link keeps them
+DRIVE_HOSTS = ('drive.google.com', 'docs.google.com')
+DRIVE_FILE_PATH = re.compile(r'^/(?:a/[^/]+/)?file/d/([\w-]+)')
+DRIVE_FOLDER_PATH = re.compile(r'^/drive/(?:u/\d+/)?folders/([\w-]+)')
+DRIVE_DOC_PATH = re.compile(r'^/(?:document|spreadsheets|presentation)/d/([\w-]+)')
+
+# Mega file links, current (/file/<id>#<key>) and legacy (#!<id>!<key>)
+MEGA_HOSTS = ('mega.nz', 'mega.co.nz', 'mega.io')
+MEGA_FILE_PATH = re.compile(r'^/file/([\w-]+)$')
+MEGA_LEGACY_FRAGMENT = re.compile(r'^!([\w-]+)!([\w-]+)$')
+MEGA_FOLDER = re.compile(r'^/folder/|^F!')
+
+DROPBOX_HOSTS = ('dropbox.com', 'www.dropbox.com')
+# Query parameters that change what a Dropbox link serves (dl=0, the preview, is the default)
+DROPBOX_PARAMS = ('rlkey', 'dl', 'raw')
+
+# Query parameters that never change what a link points to
+TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+                   'fbclid', 'gclid', 'usp')
+
+class UnsupportedLink(ValueError):
+    """Raised for links that can never be a single file, such as folders"""
+
+def canonicalize(url):
+    """
+    Reduce a link to one canonical form per file.
+    
+    Google Drive, Mega and Dropbox links are rewritten to a fixed form built from
+    the file id, so share, open and download links for one file match. Other
+    links get a lowercase scheme and host, no default port, no fragment and no
+    tracking parameters. Raises UnsupportedLink for folder links.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    
+    if host in DRIVE_HOSTS:
+        return _canonical_drive(parts)
+    if host in MEGA_HOSTS:
+        return _canonical_mega(parts)
+    if host in DROPBOX_HOSTS:
+        return _canonical_dropbox(parts)
+    
+    userinfo, _, hostport = parts.netloc.rpartition('@')
+    netloc = hostport.lower()
+    default_port = {'http': ':80', 'https': ':443'}.get(scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+    if userinfo:
+        netloc = f"{userinfo}@{netloc}"
+    
+    return urlunsplit((scheme, netloc, parts.path or '/', _strip_tracking(parts.query), ''))
+
+def drive_file_id(url):
+    """Get the file id of a canonical Google Drive link, or None for other links"""
+    match = re.match(r'^https://drive\.google\.com/file/d/([\w-]+)/view$', url)
+    return match.group(1) if match else None
+
+def _strip_tracking(query):
+    """Drop tracking parameters from a query string, keeping the rest as they are"""
+    params = [param for param in query.split('&') if param and param.split('=', 1)[0] not in TRACKING_PARAMS]
+    return '&'.join(params)
+
+def _canonical_drive(parts):
+    """https://drive.google.com/file/d/<id>/view for any Drive file link"""
+    if DRIVE_FOLDER_PATH.match(parts.path):
+        raise UnsupportedLink("Drive folders are not supported, send a link to a single file.")
+    
+    match = DRIVE_FILE_PATH.match(parts.path) or DRIVE_DOC_PATH.match(parts.path)
+    file_id = match.group(1) if match else dict(parse_qsl(parts.query)).get('id')
+    
+    if not file_id:
+        # Not a file link we recognize; leave it as it is apart from the usual cleanup
+        return urlunsplit(('https', parts.hostname.lower(), parts.path, _strip_tracking(parts.query), ''))
+    
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+def _canonical_mega(parts):
+    """https://mega.nz/file/<id>#<key> for any Mega file link; the key stays, it is needed to download"""
+    if MEGA_FOLDER.search(parts.path) or MEGA_FOLDER.search(parts.fragment):
+        raise UnsupportedLink("Mega folders are not supported, send a link to a single file.")
+    
+    match = MEGA_FILE_PATH.match(parts.path)
+    if match:
+        return f"https://mega.nz/file/{match.group(1)}#{parts.fragment}"
+    
+    legacy = MEGA_LEGACY_FRAGMENT.match(parts.fragment)
+    if legacy:
+        return f"https://mega.nz/file/{legacy.group(1)}#{legacy.group(2)}"
+    
+    return urlunsplit(('https', 'mega.nz', parts.path, parts.query, parts.fragment))
+
+def _canonical_dropbox(parts):
+    """
+    https://www.dropbox.com/... keeping only 'rlkey', which shared links need, and
+    'dl'/'raw', which make it a direct download rather than the preview page
+    """
+    params = [
+        param for param in parts.query.split('&')
+        if param.split('=', 1)[0] in DROPBOX_PARAMS and param != 'dl=0'
+    ]
+    return urlunsplit(('https', 'www.dropbox.com', parts.path, '&'.join(params), ''))
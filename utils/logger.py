@@ -1,40 +1,266 @@
 import json
+import logging
 import os
-from datetime import datetime
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from utils import registry
+from utils.batch_writer import BatchWriter
 
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOGS_DB = 'logs.db'
+
+# Legacy log file, imported into LOGS_DB once and then renamed
 LOGS_FILE = 'logs.json'
 
-def load_logs():
-    """Load logs from JSON file"""
+# Batching, overridable from .env
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '50'))
+LOG_FLUSH_MS = int(os.getenv('LOG_FLUSH_MS', '500'))
+
+# Bumped when the rollup tables change, to rebuild them from the logs
+ROLLUP_VERSION = 1
+
+_conn = None
+_conn_lock = threading.Lock()
+
+def _connect():
+    """Open the log database, creating or upgrading the tables on first use"""
+    global _conn
+    
+    if _conn is None:
+        _conn = sqlite3.connect(LOGS_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        # Worker processes start together; one of them creates or upgrades the tables
+        with registry.file_lock(LOGS_DB):
+            _conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "id INTEGER PRIMARY KEY, user TEXT, user_id INTEGER, "
+                "link TEXT, timestamp TEXT, providers TEXT)"
+            )
+            _upgrade(_conn)
+            _conn.commit()
+    
+    return _conn
+
+def _upgrade(conn):
+    """Add the provider column, indexes and rollup tables, and build the rollups once"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(uploads)")]
+    if 'providers' not in columns:
+        conn.execute("ALTER TABLE uploads ADD COLUMN providers TEXT")
+    
+    conn.execute("CREATE INDEX IF NOT EXISTS uploads_user_id ON uploads (user_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS uploads_timestamp ON uploads (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS uploads_link ON uploads (link, timestamp)")
+    
+    # Rollups, kept up to date by every batch of log writes
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS user_rollup ("
+        "user_id INTEGER, day TEXT, user TEXT, uploads INTEGER, PRIMARY KEY (user_id, day))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS user_rollup_day ON user_rollup (day)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS hour_rollup (hour TEXT PRIMARY KEY, uploads INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS link_rollup ("
+        "day TEXT, link TEXT, uploads INTEGER, PRIMARY KEY (day, link))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS provider_rollup ("
+        "day TEXT, kind TEXT, provider TEXT, result TEXT, calls INTEGER, seconds REAL, "
+        "PRIMARY KEY (day, kind, provider, result))"
+    )
+    
+    # Logs written before the rollups existed are counted once
+    if conn.execute("PRAGMA user_version").fetchone()[0] < ROLLUP_VERSION:
+        rows = conn.execute("SELECT user, user_id, link, timestamp, providers FROM uploads").fetchall()
+        _roll_up(conn, rows)
+        conn.execute(f"PRAGMA user_version = {ROLLUP_VERSION}")
+
+def _roll_up(conn, rows):
+    """Add log rows, as (user, user_id, link, timestamp, providers JSON), to the rollups"""
+    conn.executemany(
+        "INSERT INTO user_rollup (user_id, day, user, uploads) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT (user_id, day) DO UPDATE SET uploads = uploads + 1, user = excluded.user",
+        [(user_id, timestamp[:10], user) for user, user_id, link, timestamp, _ in rows]
+    )
+    conn.executemany(
+        "INSERT INTO hour_rollup (hour, uploads) VALUES (?, 1) "
+        "ON CONFLICT (hour) DO UPDATE SET uploads = uploads + 1",
+        [(timestamp[:13],) for _, _, _, timestamp, _ in rows]
+    )
+    conn.executemany(
+        "INSERT INTO link_rollup (day, link, uploads) VALUES (?, ?, 1) "
+        "ON CONFLICT (day, link) DO UPDATE SET uploads = uploads + 1",
+        [(timestamp[:10], link) for _, _, link, timestamp, _ in rows]
+    )
+    conn.executemany(
+        "INSERT INTO provider_rollup (day, kind, provider, result, calls, seconds) VALUES (?, ?, ?, ?, 1, ?) "
+        "ON CONFLICT (day, kind, provider, result) DO UPDATE SET "
+        "calls = calls + 1, seconds = seconds + excluded.seconds",
+        [
+            (timestamp[:10], call['kind'], call['provider'], call['result'], call['latency'])
+            for _, _, _, timestamp, providers in rows
+            for call in json.loads(providers or '[]')
+        ]
+    )
+
+def _write_entries(entries):
+    """Append a batch of log entries and update the rollups, in one transaction"""
+    rows = [
+        (e['user'], e['user_id'], e['link'], e['timestamp'], json.dumps(e['providers']) if e.get('providers') else None)
+        for e in entries
+    ]
+    
+    with _conn_lock:
+        conn = _connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO uploads (user, user_id, link, timestamp, providers) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            _roll_up(conn, rows)
+
+_writer = BatchWriter(
+    _write_entries,
+    max_batch=LOG_BATCH_SIZE,
+    interval=LOG_FLUSH_MS / 1000,
+    name='Upload log'
+)
+
+def migrate_legacy_logs():
+    """Import logs.json into the log database once, then rename it"""
     if not os.path.exists(LOGS_FILE):
-        return []
-    
-    try:
-        with open(LOGS_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
-
-def save_logs(logs):
-    """Save logs to JSON file"""
-    try:
-        with open(LOGS_FILE, 'w') as f:
-            json.dump(logs, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving logs: {e}")
-        return False
-
-def log_upload(username, user_id, link):
-    """Log an upload event"""
-    logs = load_logs()
+        return 0
     
+    # Every worker process tries this; the first one to get the lock does it
+    with registry.file_lock(LOGS_DB):
+        try:
+            with open(LOGS_FILE, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except json.JSONDecodeError:
+            entries = []
+        
+        _write_entries(entries)
+        os.replace(LOGS_FILE, LOGS_FILE + '.migrated')
+    
+    logger.info(f"Migrated {len(entries)} entries from {LOGS_FILE} to {LOGS_DB}")
+    return len(entries)
+
+async def start_log_writer():
+    """Migrate legacy logs and start batching log writes"""
+    migrate_legacy_logs()
+    _writer.start()
+
+async def stop_log_writer():
+    """Flush pending log entries and stop the writer"""
+    await _writer.stop()
+
+def load_logs():
+    """Load all logs from the log database"""
+    with _conn_lock:
+        rows = _connect().execute(
+            "SELECT user, user_id, link, timestamp FROM uploads ORDER BY id"
+        ).fetchall()
+    
+    return [
+        {"user": user, "user_id": user_id, "link": link, "timestamp": timestamp}
+        for user, user_id, link, timestamp in rows
+    ]
+
+def log_upload(username, user_id, link, providers=None):
+    """
+    Log an upload event.
+    
+    `providers` lists the provider calls made for it, as dicts with 'kind',
+    'provider', 'result' and 'latency' in seconds.
+    """
     log_entry = {
         "user": username,
         "user_id": user_id,
         "link": link,
-        "timestamp": datetime.utcnow().isoformat() + "Z"
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "providers": list(providers) if providers else None
     }
     
-    logs.append(log_entry)
-    save_logs(logs)
+    _writer.add(log_entry)
+
+def user_history(user_id, limit=10):
+    """
+    Get a user's latest uploads and upload counts, from the index and rollups.
+    
+    Returns {'recent': [(link, timestamp)...], 'today': n, 'week': n, 'total': n}.
+    """
+    today = datetime.utcnow().date()
+    week_start = (today - timedelta(days=6)).isoformat()
+    
+    with _conn_lock:
+        conn = _connect()
+        recent = conn.execute(
+            "SELECT link, timestamp FROM uploads WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        today_count, week_count, total = conn.execute(
+            "SELECT "
+            "COALESCE(SUM(CASE WHEN day = ? THEN uploads END), 0), "
+            "COALESCE(SUM(CASE WHEN day >= ? THEN uploads END), 0), "
+            "COALESCE(SUM(uploads), 0) "
+            "FROM user_rollup WHERE user_id = ?",
+            (today.isoformat(), week_start, user_id)
+        ).fetchone()
+    
+    return {'recent': recent, 'today': today_count, 'week': week_count, 'total': total}
+
+def top_stats(days=7, limit=10):
+    """
+    Summarize the last `days` days from the rollups alone.
+    
+    Returns uploads in the last 24 hours and in the period, the top users and
+    links, and calls, total seconds and failures per provider.
+    """
+    now = datetime.utcnow()
+    since_day = (now.date() - timedelta(days=days - 1)).isoformat()
+    since_hour = (now - timedelta(hours=23)).isoformat()[:13]
+    
+    with _conn_lock:
+        conn = _connect()
+        last_day = conn.execute(
+            "SELECT COALESCE(SUM(uploads), 0) FROM hour_rollup WHERE hour >= ?", (since_hour,)
+        ).fetchone()[0]
+        period = conn.execute(
+            "SELECT COALESCE(SUM(uploads), 0) FROM user_rollup WHERE day >= ?", (since_day,)
+        ).fetchone()[0]
+        users = conn.execute(
+            # With a single max(), SQLite takes the bare `user` from that row: the latest name
+            "SELECT user_id, user, SUM(uploads) AS total, MAX(day) FROM user_rollup WHERE day >= ? "
+            "GROUP BY user_id ORDER BY total DESC LIMIT ?",
+            (since_day, limit)
+        ).fetchall()
+        users = [(user_id, user, total) for user_id, user, total, _ in users]
+        links = conn.execute(
+            "SELECT link, SUM(uploads) AS total FROM link_rollup WHERE day >= ? "
+            "GROUP BY link ORDER BY total DESC LIMIT ?",
+            (since_day, limit)
+        ).fetchall()
+        providers = conn.execute(
+            "SELECT kind, provider, SUM(calls), SUM(seconds), SUM(CASE WHEN result != 'ok' THEN calls ELSE 0 END) "
+            "FROM provider_rollup WHERE day >= ? GROUP BY kind, provider ORDER BY SUM(calls) DESC",
+            (since_day,)
+        ).fetchall()
+    
+    return {
+        'days': days,
+        'last_day': last_day,
+        'period': period,
+        'users': users,
+        'links': links,
+        'providers': providers
+    }
@@ -0,0 +1,169 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Local Prometheus endpoint, overridable from .env (0 disables it)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# Everything is recorded from the event loop thread, so plain dict updates need no locks.
+# Counters: name -> {labels: value}
+_counters = {}
+# Gauges: name -> {labels: value}
+_gauges = {}
+# Histograms: name -> {labels: [bucket counts..., sum, count]}
+_histograms = {}
+
+_runner = None
+
+def _labels(labels):
+    """Turn keyword labels into a hashable, ordered key"""
+    return tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add to a counter"""
+    series = _counters.setdefault(name, {})
+    key = _labels(labels)
+    series[key] = series.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    """Set a gauge"""
+    _gauges.setdefault(name, {})[_labels(labels)] = value
+
+def observe(name, value, **labels):
+    """Record a value (in seconds) in a histogram"""
+    series = _histograms.setdefault(name, {})
+    key = _labels(labels)
+    
+    data = series.get(key)
+    if data is None:
+        data = series[key] = [0] * len(BUCKETS) + [0.0, 0]
+    
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            data[i] += 1
+            break
+    
+    data[-2] += value
+    data[-1] += 1
+
+@contextmanager
+def timer(name, **labels):
+    """Time a block into a histogram"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - started, **labels)
+
+def quantile(data, q):
+    """Estimate a quantile from histogram data, interpolating inside the bucket"""
+    count = data[-1]
+    if not count:
+        return 0.0
+    
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    
+    for i, bound in enumerate(BUCKETS):
+        in_bucket = data[i]
+        if seen + in_bucket >= rank and in_bucket:
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (rank - seen) / in_bucket
+        seen += in_bucket
+        lower = bound
+    
+    return lower
+
+def counters(name):
+    """Get all series of a counter as {labels: value}"""
+    return {key: value for key, value in _counters.get(name, {}).items()}
+
+def histograms(name):
+    """Get all series of a histogram as {labels: data}"""
+    return dict(_histograms.get(name, {}))
+
+def _format_labels(key, extra=()):
+    """Format labels the Prometheus way"""
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+def render_prometheus():
+    """Render every metric in the Prometheus text format"""
+    lines = []
+    
+    for name, series in _counters.items():
+        lines.append(f"# TYPE {name} counter")
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    
+    for name, series in _gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    
+    for name, series in _histograms.items():
+        lines.append(f"# TYPE {name} histogram")
+        for key, data in series.items():
+            cumulative = 0
+            for i, bound in enumerate(BUCKETS):
+                cumulative += data[i]
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {data[-2]}")
+            lines.append(f"{name}_count{_format_labels(key)} {data[-1]}")
+    
+    return '\n'.join(lines) + '\n'
+
+async def _handle_metrics(request):
+    """Serve /metrics"""
+    return web.Response(text=render_prometheus(), content_type='text/plain', charset='utf-8')
+
+async def start_server():
+    """Start the local metrics endpoint; the bot runs on without it if the port is taken"""
+    global _runner
+    
+    if not METRICS_PORT or _runner is not None:
+        return
+    
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {METRICS_HOST}:{METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return
+    
+    _runner = runner
+    
+    logger.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+async def stop_server():
+    """Stop the local metrics endpoint"""
+    global _runner
+    
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
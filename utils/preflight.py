@@ -0,0 +1,134 @@
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from urllib.parse import urljoin
+import aiohttp
+from dotenv import load_dotenv
+from utils.http_pool import BlockedAddress, get_shared_session, is_public_url
+from utils.links import drive_file_id
+from utils import coalescer, metrics, retry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Link checks, overridable from .env: on/off, probe timeout, and how long verdicts
+# are kept for good and for rejected links
+PREFLIGHT = os.getenv('PREFLIGHT', 'on').lower() in ('1', 'true', 'yes', 'on')
+PREFLIGHT_TIMEOUT = aiohttp.ClientTimeout(total=float(os.getenv('PREFLIGHT_TIMEOUT', '5')))
+PREFLIGHT_OK_TTL = int(os.getenv('PREFLIGHT_OK_TTL', '1800'))
+PREFLIGHT_BAD_TTL = int(os.getenv('PREFLIGHT_BAD_TTL', '120'))
+PREFLIGHT_CACHE_MAX_ENTRIES = int(os.getenv('PREFLIGHT_CACHE_MAX_ENTRIES', '10000'))
+
+# Hosts whose file pages can't be probed without their own client (e.g. Mega's
+# key-encrypted links); they are passed through unchecked
+UNPROBED_HOSTS = ('https://mega.nz/',)
+
+# Redirects followed by a probe
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+BLOCKED_MESSAGE = "The link does not point to a public website."
+
+# Canonical link -> (problem or None, expires at)
+_verdicts = OrderedDict()
+
+async def check(link):
+    """
+    Check that a canonical link points to a reachable file before any provider sees it.
+    
+    Returns None if the link looks fine, or a message saying what is wrong.
+    Verdicts are cached, and concurrent checks of one link share a single probe.
+    A probe that gets no answer lets the link through uncached: a slow host is
+    no reason to refuse a link the providers may still manage to fetch.
+    """
+    if not PREFLIGHT or link.startswith(UNPROBED_HOSTS):
+        return None
+    
+    entry = _verdicts.get(link)
+    if entry is not None and entry[1] > time.monotonic():
+        _verdicts.move_to_end(link)
+        metrics.inc('preflight_checks_total', result='cached')
+        return entry[0]
+    
+    try:
+        problem = await coalescer.run_once(('preflight', link), lambda: _probe(link))
+    except Exception as e:
+        logger.warning(f"Preflight of {link} got no answer: {retry.describe(e)}")
+        metrics.inc('preflight_checks_total', result='unknown')
+        return None
+    
+    ttl = PREFLIGHT_BAD_TTL if problem else PREFLIGHT_OK_TTL
+    _verdicts[link] = (problem, time.monotonic() + ttl)
+    _verdicts.move_to_end(link)
+    
+    while len(_verdicts) > PREFLIGHT_CACHE_MAX_ENTRIES:
+        _verdicts.popitem(last=False)
+    
+    return problem
+
+async def _probe(link):
+    """Probe a link with HEAD, falling back to a one-byte ranged GET"""
+    file_id = drive_file_id(link)
+    url = f"https://drive.google.com/uc?id={file_id}&export=download" if file_id else link
+    
+    try:
+        status, final_url = await _request('HEAD', url)
+        
+        # Plenty of servers refuse HEAD but serve GET
+        if status >= 400:
+            status, final_url = await _request('GET', url, headers={'Range': 'bytes=0-0'})
+    except BlockedAddress:
+        metrics.inc('preflight_checks_total', result='blocked')
+        return BLOCKED_MESSAGE
+    except aiohttp.ClientConnectorError as e:
+        if isinstance(e.os_error, BlockedAddress):
+            metrics.inc('preflight_checks_total', result='blocked')
+            return BLOCKED_MESSAGE
+        if not isinstance(e.os_error, socket.gaierror):
+            raise
+        metrics.inc('preflight_checks_total', result='rejected')
+        return "The link's website does not exist."
+    
+    problem = _judge(status, final_url)
+    metrics.inc('preflight_checks_total', result='rejected' if problem else 'ok')
+    
+    return problem
+
+async def _request(method, url, headers=None):
+    """
+    Make a probe request, returning the final status and URL after redirects.
+    
+    Redirects are followed one by one, so none can lead the bot to a
+    loopback or private address; names are checked by the session's resolver.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        if not is_public_url(url):
+            raise BlockedAddress(url)
+        
+        async with get_shared_session().request(
+            method, url, headers=headers, allow_redirects=False, timeout=PREFLIGHT_TIMEOUT
+        ) as response:
+            location = response.headers.get('Location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response.status, str(response.url)
+            url = urljoin(str(response.url), location)
+    
+    return response.status, url
+
+def _judge(status, final_url):
+    """Turn a probe's outcome into a problem message, or None"""
+    # Private Drive files send visitors to the sign-in page
+    if final_url.startswith('https://accounts.google.com/'):
+        return "The file is private. Share it with \"Anyone with the link\" and try again."
+    if status in (404, 410):
+        return "The file was not found. Check the link and try again."
+    if status in (401, 403):
+        return "The file is private or needs a login."
+    if 400 <= status < 500 and status != 429:
+        return f"The link could not be opened (HTTP {status})."
+    
+    # 429 and 5xx say nothing about the file itself
+    return None
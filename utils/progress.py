@@ -0,0 +1,25 @@
+from utils import sender
+
+class ProgressMessage:
+    """
+    Keep a sent message up to date with edits.
+    
+    Edits go through the sender, which paces them with the chat's other messages
+    and replaces an edit still waiting in the queue with a newer one, so a burst
+    of finished sections costs one edit.
+    """
+    
+    def __init__(self, message):
+        self.message = message
+        self._text = message.text
+    
+    def update(self, text):
+        """Show `text` as soon as the chat's send limit allows"""
+        if text != self._text:
+            self._text = text
+            sender.edit(self.message, text)
+    
+    async def finish(self, text):
+        """Show the final text and wait until it is sent"""
+        self._text = text
+        await sender.edit(self.message, text)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from utils import key_pool
+
+load_dotenv()
+
+# Defaults for providers without a "limits" entry, overridable from .env
+DEFAULT_RPS = float(os.getenv('RATE_LIMIT_RPS', '5'))
+DEFAULT_BURST = float(os.getenv('RATE_LIMIT_BURST', '10'))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('PROVIDER_CONCURRENCY', '8'))
+
+# Outcomes reported back to a limiter
+OK = 'ok'
+OVERLOAD = 'overload'
+ERROR = 'error'
+
+class ProviderLimiter:
+    """
+    Token bucket plus adaptive (AIMD) concurrency limit for one provider.
+    
+    Every request takes a token from a bucket refilled at `rps` tokens per second
+    (up to `burst`) and a slot under the concurrency limit. The limit grows by
+    1/limit on each success, about one slot per round of requests, and is halved
+    when the provider signals overload (429, 5xx or a timeout).
+    """
+    
+    def __init__(self, rps, burst, max_concurrency):
+        self.configure(rps, burst, max_concurrency)
+        self.limit = max(1.0, max_concurrency / 2)
+        self.in_flight = 0
+        self.tokens = self.burst
+        self._refilled = time.monotonic()
+        self._waiters = deque()
+    
+    def configure(self, rps, burst, max_concurrency):
+        """Apply (possibly changed) limits from the provider config"""
+        self.rps = rps
+        self.burst = max(1.0, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        
+        if hasattr(self, 'limit'):
+            self.limit = min(self.limit, self.max_concurrency)
+    
+    async def acquire(self):
+        """Wait for a concurrency slot and a token"""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+                raise
+        
+        self.in_flight += 1
+        
+        try:
+            await self._take_token()
+        except asyncio.CancelledError:
+            self.release(ERROR)
+            raise
+    
+    async def _take_token(self):
+        """Wait until the token bucket allows another request"""
+        if self.rps <= 0:
+            return
+        
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rps)
+            self._refilled = now
+            
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            
+            await asyncio.sleep((1 - self.tokens) / self.rps)
+    
+    def release(self, outcome):
+        """Free a slot and adapt the limit to the request's outcome"""
+        self.in_flight -= 1
+        
+        if outcome == OK:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif outcome == OVERLOAD:
+            self.limit = max(1.0, self.limit / 2)
+        
+        self._wake()
+    
+    def _wake(self):
+        """Wake as many waiters as there are free slots"""
+        free = int(self.limit) - self.in_flight
+        
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+# Live limiters: (kind, name) -> ProviderLimiter
+_limiters = {}
+
+def _config(entry):
+    """Read a provider's limits, falling back to the defaults; limits are per API key"""
+    limits = entry.get('limits') or {}
+    keys = len(key_pool.api_keys(entry))
+    
+    return (
+        float(limits.get('rps', DEFAULT_RPS)) * keys,
+        float(limits.get('burst', DEFAULT_BURST)) * keys,
+        int(limits.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)) * keys
+    )
+
+def get_limiter(kind, entry):
+    """Get the limiter for a shortener or uploader entry"""
+    key = (kind, entry['name'])
+    config = _config(entry)
+    limiter = _limiters.get(key)
+    
+    if limiter is None:
+        limiter = ProviderLimiter(*config)
+        _limiters[key] = limiter
+    elif (limiter.rps, limiter.burst, limiter.max_concurrency) != config:
+        limiter.configure(*config)
+    
+    return limiter
+
+def describe(kind, entry):
+    """Describe a provider's live limits for listings"""
+    limiter = get_limiter(kind, entry)
+    rate = f"{limiter.rps:g} req/s" if limiter.rps > 0 else "no rate limit"
+    
+    return f"limit {int(limiter.limit)}/{limiter.max_concurrency}, {rate}"
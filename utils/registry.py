@@ -0,0 +1,151 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+# Parsed config files: path -> {'stamp': (mtime, size), 'data': [...], 'active': [...], 'derived': {...}}
+_cache = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Lock files held by the current thread
+_held = threading.local()
+
+# ADMIN_ID as last parsed: (raw value, set of ids)
+_admins = (None, frozenset())
+
+def _lock(path):
+    """Get the write lock for a config file (re-entrant, so edit() can call save())"""
+    with _locks_guard:
+        return _locks.setdefault(path, threading.RLock())
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on `path`.lock, shared with other bot processes.
+    
+    Re-entrant within a thread: an inner lock of a path already held is a no-op.
+    """
+    held = _held.__dict__.setdefault('paths', set())
+    
+    if fcntl is None or path in held:
+        yield
+        return
+    
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _stamp(path):
+    """Get the (mtime, size) stamp of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _read(path):
+    """Read a JSON list from disk"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+def _store(path, stamp, data):
+    """Cache parsed data along with its precomputed active view"""
+    entry = {
+        'stamp': stamp,
+        'data': data,
+        'active': [item for item in data if item.get('status') == 'active'],
+        'derived': {}
+    }
+    _cache[path] = entry
+    return entry
+
+def _entry(path):
+    """Get the cached entry for a file, reloading it only if the file changed"""
+    stamp = _stamp(path)
+    entry = _cache.get(path)
+    
+    if entry is None or entry['stamp'] != stamp:
+        entry = _store(path, stamp, _read(path) if stamp else [])
+    
+    return entry
+
+def load(path):
+    """Load a config list; the returned copy is safe to modify and save back"""
+    return copy.deepcopy(_entry(path)['data'])
+
+def active(path):
+    """Get the active entries of a config list (shared, do not modify)"""
+    return _entry(path)['active']
+
+def derived(path, build):
+    """Get `build(data)` for a config list, rebuilt only when the file changes (shared, do not modify)"""
+    entry = _entry(path)
+    
+    if build not in entry['derived']:
+        entry['derived'][build] = build(entry['data'])
+    
+    return entry['derived'][build]
+
+@contextmanager
+def editing(path):
+    """
+    Hold a config file's locks from load to save.
+    
+    Edits made as load -> modify -> save inside the block can't lose, or be
+    lost to, concurrent edits from other threads or bot processes.
+    """
+    with _lock(path), file_lock(path):
+        yield
+
+def save(path, data):
+    """Write a config list atomically via a temp file and rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    
+    with _lock(path), file_lock(path):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            print(f"Error saving {path}: {e}")
+            return False
+        
+        _store(path, _stamp(path), copy.deepcopy(data))
+    
+    return True
+
+def admin_ids():
+    """Get the set of admin ids from ADMIN_ID, parsing it only when it changes"""
+    global _admins
+    
+    raw = os.getenv('ADMIN_ID', '')
+    
+    if raw != _admins[0]:
+        # Support multiple admin IDs separated by commas
+        ids = frozenset(int(id.strip()) for id in raw.split(',') if id.strip())
+        _admins = (raw, ids)
+    
+    return _admins[1]
@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Retry tuning, overridable from .env
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '8'))
+RETRY_BUDGET = int(os.getenv('RETRY_BUDGET', '10'))
+
+# Error classes
+CONNECT = 'connect'
+DISCONNECTED = 'disconnected'
+TIMEOUT = 'timeout'
+RATE_LIMITED = 'rate_limited'
+SERVER = 'server'
+CLIENT = 'client'
+BAD_RESPONSE = 'bad_response'
+OTHER = 'other'
+
+RETRYABLE = {CONNECT, DISCONNECTED, TIMEOUT, RATE_LIMITED, SERVER}
+
+# Failures that say the provider itself is in trouble, as opposed to a bad link or request
+PROVIDER_FAULTS = {CONNECT, DISCONNECTED, TIMEOUT, RATE_LIMITED, SERVER}
+
+class BadResponse(Exception):
+    """Raised when a provider answers with something we cannot use"""
+
+# Retries left for the current request, shared by every task it starts
+_budget = contextvars.ContextVar('retry_budget', default=None)
+
+def new_budget(retries=RETRY_BUDGET):
+    """Give the current request (and the tasks it starts from now on) a fresh retry budget"""
+    _budget.set({'left': retries})
+
+def classify(error):
+    """Classify a provider error"""
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+        return TIMEOUT
+    if isinstance(error, aiohttp.ClientResponseError):
+        if error.status == 429:
+            return RATE_LIMITED
+        if error.status >= 500:
+            return SERVER
+        if isinstance(error, aiohttp.ContentTypeError):
+            return BAD_RESPONSE
+        return CLIENT
+    # ClientConnectorError is a ClientOSError raised before the request was sent;
+    # the others can happen after the provider got it
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return CONNECT
+    if isinstance(error, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError)):
+        return DISCONNECTED
+    if isinstance(error, (BadResponse, json.JSONDecodeError, aiohttp.ClientPayloadError)):
+        return BAD_RESPONSE
+    return OTHER
+
+def describe(error):
+    """Describe an error for logs without dumping request headers (they hold API keys)"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return f"HTTP {error.status} {error.message}"
+    return f"{type(error).__name__}: {error}"
+
+def retry_after(error):
+    """Get the delay a 429/503 response asked for, in seconds, or None"""
+    headers = getattr(error, 'headers', None)
+    value = headers.get('Retry-After') if headers else None
+    
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def next_delay(error, attempt, idempotent):
+    """
+    Decide whether to retry after a failed attempt (0-based).
+    
+    Returns the delay in seconds before the next attempt, or None to give up.
+    Requests that may have reached the provider are only retried when they are
+    idempotent; failures to connect never reached it and are always safe, while
+    a connection dropped after sending (DISCONNECTED) is not.
+    """
+    error_class = classify(error)
+    
+    if error_class not in RETRYABLE or attempt + 1 >= RETRY_MAX_ATTEMPTS:
+        return None
+    
+    if not idempotent and error_class != CONNECT:
+        return None
+    
+    budget = _budget.get()
+    if budget is not None:
+        if budget['left'] <= 0:
+            return None
+        budget['left'] -= 1
+    
+    # Full jitter: anywhere up to the exponential backoff, so retries don't synchronize
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    
+    requested = retry_after(error)
+    if requested is not None:
+        if requested > RETRY_MAX_DELAY:
+            return None
+        delay = max(delay, requested)
+    
+    return delay
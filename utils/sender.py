@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dotenv import load_dotenv
+from telegram.error import BadRequest, RetryAfter
+from utils import metrics, tracing
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Outbound limits, overridable from .env: messages per second across all chats,
+# and seconds between messages to one private chat / one group
+SEND_RATE = float(os.getenv('SEND_RATE', '30'))
+SEND_BURST = int(os.getenv('SEND_BURST', '10'))
+SEND_CHAT_INTERVAL = float(os.getenv('SEND_CHAT_INTERVAL', '1.0'))
+SEND_GROUP_INTERVAL = float(os.getenv('SEND_GROUP_INTERVAL', '3.0'))
+
+# Telegram's limit on message length, also the limit for merged messages
+MAX_MESSAGE_LENGTH = 4096
+
+# Pending sends per chat, served round-robin
+_chats = OrderedDict()
+_queued = 0
+
+# Chats with a send in flight, and when each chat may send next (loop time)
+_sending = set()
+_next_send = {}
+
+# Delivery tasks in flight; the loop only keeps weak references to tasks
+_deliveries = set()
+
+_tokens = float(SEND_BURST)
+_refilled = 0.0
+_wakeup = asyncio.Event()
+_task = None
+
+def send(bot, chat_id, text, merge=True, future=None, **kwargs):
+    """
+    Queue a text message and return a future for the sent Message.
+    
+    Queued messages to the same chat with the same options are sent as one
+    when `merge` is set and they fit. Pass `future` to have it resolved
+    instead of a new one.
+    """
+    return _enqueue(bot, chat_id, 'send_message', dict(kwargs, chat_id=chat_id, text=text),
+                    merge, future)
+
+def reply(message, text, merge=True, future=None, **kwargs):
+    """Queue a message to the chat of `message`, quoting it in groups like Message.reply_text"""
+    if message.chat.type != 'private':
+        kwargs.setdefault('reply_to_message_id', message.message_id)
+    
+    return send(message.get_bot(), message.chat_id, text, merge, future, **kwargs)
+
+def send_document(bot, chat_id, document, **kwargs):
+    """Queue a document; pass bytes rather than a stream, since a send may be retried"""
+    return _enqueue(bot, chat_id, 'send_document', dict(kwargs, chat_id=chat_id, document=document))
+
+def edit(message, text):
+    """
+    Queue an edit of a sent message.
+    
+    An edit of the same message still waiting in the queue is replaced, so
+    only the newest text is sent; both callers get the same future.
+    """
+    for item in _chats.get(message.chat_id, ()):
+        if item['method'] == 'edit_message_text' and item['kwargs']['message_id'] == message.message_id:
+            item['kwargs']['text'] = text
+            return item['futures'][0]
+    
+    return _enqueue(message.get_bot(), message.chat_id, 'edit_message_text', {
+        'chat_id': message.chat_id,
+        'message_id': message.message_id,
+        'text': text
+    })
+
+def _enqueue(bot, chat_id, method, kwargs, merge=False, future=None):
+    """Add a send to its chat's queue"""
+    global _queued
+    
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+    # Callers may fire and forget; failures are logged here
+    future.add_done_callback(_consume)
+    # Queue wait plus the Bot API call, in the trace of the request that sent it
+    tracing.span_future(f"telegram.{method}", future)
+    
+    _chats.setdefault(chat_id, deque()).append({
+        'bot': bot,
+        'method': method,
+        'kwargs': kwargs,
+        'merge': merge,
+        'futures': [future],
+        'queued': time.monotonic()
+    })
+    
+    _queued += 1
+    metrics.set_gauge('send_queue_depth', _queued)
+    _wakeup.set()
+    
+    return future
+
+def _consume(future):
+    """Mark a future's exception as retrieved"""
+    if not future.cancelled():
+        future.exception()
+
+def _take(chat_id):
+    """Take the next send for a chat, merged with the text messages queued behind it"""
+    global _queued
+    
+    queue = _chats[chat_id]
+    item = queue.popleft()
+    _queued -= 1
+    
+    while item['merge'] and queue and queue[0]['merge']:
+        following = queue[0]
+        text = item['kwargs']['text'] + "\n\n" + following['kwargs']['text']
+        
+        same_options = (
+            {k: v for k, v in item['kwargs'].items() if k != 'text'} ==
+            {k: v for k, v in following['kwargs'].items() if k != 'text'}
+        )
+        if not same_options or len(text) > MAX_MESSAGE_LENGTH:
+            break
+        
+        queue.popleft()
+        _queued -= 1
+        item['kwargs']['text'] = text
+        item['futures'] += following['futures']
+        metrics.inc('telegram_merged_messages_total')
+    
+    # Chats with more to send go to the back of the line
+    del _chats[chat_id]
+    if queue:
+        _chats[chat_id] = queue
+    
+    metrics.set_gauge('send_queue_depth', _queued)
+    return item
+
+def _ready_chat(now):
+    """Get the first chat allowed to send now, and the time until one is, if none"""
+    wait = None
+    
+    for chat_id in _chats:
+        if chat_id in _sending:
+            continue
+        
+        delay = _next_send.get(chat_id, 0.0) - now
+        if delay <= 0:
+            return chat_id, None
+        
+        wait = delay if wait is None else min(wait, delay)
+    
+    return None, wait
+
+async def _take_token():
+    """Wait for a token from the global bucket"""
+    global _tokens, _refilled
+    
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        now = loop.time()
+        _tokens = min(SEND_BURST, _tokens + (now - _refilled) * SEND_RATE)
+        _refilled = now
+        
+        if _tokens >= 1:
+            _tokens -= 1
+            return
+        
+        await asyncio.sleep((1 - _tokens) / SEND_RATE)
+
+async def _run():
+    """Hand queued sends to delivery tasks as the global and per-chat limits allow"""
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        _wakeup.clear()
+        chat_id, wait = _ready_chat(loop.time())
+        
+        if chat_id is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        
+        await _take_token()
+        
+        # The chat may have been picked while waiting for a token; check it again
+        if chat_id not in _chats:
+            continue
+        
+        item = _take(chat_id)
+        _sending.add(chat_id)
+        metrics.observe('send_queue_seconds', time.monotonic() - item['queued'])
+        task = asyncio.create_task(_deliver(chat_id, item))
+        _deliveries.add(task)
+        task.add_done_callback(_deliveries.discard)
+
+async def _deliver(chat_id, item):
+    """Make one Bot API call and resolve its futures"""
+    global _queued
+    
+    loop = asyncio.get_running_loop()
+    interval = SEND_GROUP_INTERVAL if chat_id < 0 else SEND_CHAT_INTERVAL
+    
+    try:
+        with metrics.timer('telegram_send_seconds'):
+            result = await getattr(item['bot'], item['method'])(**item['kwargs'])
+    except RetryAfter as e:
+        # Flood control: put it back in front and pause the chat
+        _chats.setdefault(chat_id, deque()).appendleft(item)
+        _queued += 1
+        metrics.set_gauge('send_queue_depth', _queued)
+        metrics.inc('telegram_sends_total', method=item['method'], result='retry_after')
+        interval = max(interval, e.retry_after)
+        logger.warning(f"Telegram asked to wait {e.retry_after}s before sending to chat {chat_id}")
+    except BadRequest as e:
+        # An edit that changes nothing has already done its job
+        if 'not modified' in str(e).lower():
+            metrics.inc('telegram_sends_total', method=item['method'], result='unchanged')
+            _resolve(item)
+        else:
+            metrics.inc('telegram_sends_total', method=item['method'], result='error')
+            logger.error(f"Failed to {item['method']} to chat {chat_id}: {e}")
+            _resolve(item, exception=e)
+    except Exception as e:
+        metrics.inc('telegram_sends_total', method=item['method'], result='error')
+        logger.error(f"Failed to {item['method']} to chat {chat_id}: {e}")
+        _resolve(item, exception=e)
+    else:
+        metrics.inc('telegram_sends_total', method=item['method'], result='ok')
+        _resolve(item, result=result)
+    finally:
+        _sending.discard(chat_id)
+        _next_send[chat_id] = loop.time() + interval
+        _forget_idle_chats(loop.time())
+        _wakeup.set()
+
+def _resolve(item, result=None, exception=None):
+    """Resolve every future waiting on a send"""
+    for future in item['futures']:
+        if future.done():
+            continue
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+def _forget_idle_chats(now):
+    """Drop pacing state for chats that may send again and have nothing queued"""
+    if len(_next_send) < 10000:
+        return
+    
+    for chat_id in [c for c, t in _next_send.items() if t <= now and c not in _chats]:
+        del _next_send[chat_id]
+
+def share_limits(workers):
+    """Split the overall send limits between `workers` bot processes sharing one bot token"""
+    global SEND_RATE, SEND_BURST, _tokens
+    
+    SEND_RATE /= workers
+    SEND_BURST = max(1, SEND_BURST // workers)
+    _tokens = float(SEND_BURST)
+
+def start():
+    """Start the send loop on the running loop"""
+    global _task, _refilled
+    
+    _refilled = asyncio.get_running_loop().time()
+    _task = asyncio.create_task(_run())
+
+async def stop(timeout=5.0):
+    """Give queued sends a moment to go out, then stop the send loop"""
+    global _task
+    
+    if _task is None:
+        return
+    
+    deadline = time.monotonic() + timeout
+    while (_chats or _sending) and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    
+    _task.cancel()
+    await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+    
+    # Sends already handed to Telegram get the rest of the timeout to finish
+    if _deliveries:
+        await asyncio.wait(set(_deliveries), timeout=max(0.0, deadline - time.monotonic()))
+    for task in list(_deliveries):
+        task.cancel()
+    await asyncio.gather(*_deliveries, return_exceptions=True)
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from utils.links import canonicalize, UnsupportedLink
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'short_cache.db'
+
+# Cache limits, overridable from .env
+CACHE_TTL = int(os.getenv('SHORT_CACHE_TTL', str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv('SHORT_CACHE_MAX_ENTRIES', '50000'))
+MEMORY_MAX_ENTRIES = int(os.getenv('SHORT_CACHE_MEMORY_ENTRIES', '5000'))
+
+# Prune the disk cache once every this many writes
+PRUNE_EVERY = 500
+
+# Hot entries: (shortener identity, normalized url) -> (short url, expires at)
+_memory = OrderedDict()
+_conn = None
+_writes = 0
+
+def _connect():
+    """Open the cache database, creating the table on first use"""
+    global _conn
+    
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_FILE, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA busy_timeout=5000")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS short_links ("
+            "shortener TEXT NOT NULL, url TEXT NOT NULL, short_url TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (shortener, url))"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_short_links_last_used ON short_links (last_used)")
+    
+    return _conn
+
+def shortener_identity(shortener):
+    """Identify a shortener by its base URL and API key, so editing either starts a fresh cache"""
+    raw = f"{shortener['base']}\n{shortener['api']}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def normalize_url(url):
+    """Normalize a URL for use as a cache key"""
+    try:
+        return canonicalize(url)
+    except UnsupportedLink:
+        return url.strip()
+
+def _remember(key, short_url, expires_at):
+    """Store an entry in the in-memory LRU"""
+    _memory[key] = (short_url, expires_at)
+    _memory.move_to_end(key)
+    
+    while len(_memory) > MEMORY_MAX_ENTRIES:
+        _memory.popitem(last=False)
+
+def get(shortener, url):
+    """Get a cached short link, or None on a miss"""
+    key = (shortener_identity(shortener), normalize_url(url))
+    now = time.time()
+    
+    entry = _memory.get(key)
+    if entry is not None:
+        if entry[1] > now:
+            _memory.move_to_end(key)
+            return entry[0]
+        del _memory[key]
+    
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT short_url, expires_at FROM short_links WHERE shortener = ? AND url = ?",
+            key
+        ).fetchone()
+        
+        if row is None or row[1] <= now:
+            return None
+        
+        conn.execute(
+            "UPDATE short_links SET last_used = ? WHERE shortener = ? AND url = ?",
+            (now, *key)
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Short link cache read failed: {e}")
+        return None
+    
+    _remember(key, row[0], row[1])
+    return row[0]
+
+def put(shortener, url, short_url):
+    """Cache a short link"""
+    global _writes
+    
+    key = (shortener_identity(shortener), normalize_url(url))
+    now = time.time()
+    expires_at = now + CACHE_TTL
+    
+    _remember(key, short_url, expires_at)
+    
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO short_links (shortener, url, short_url, expires_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (*key, short_url, expires_at, now)
+        )
+        
+        _writes += 1
+        if _writes % PRUNE_EVERY == 0:
+            prune()
+    except sqlite3.Error as e:
+        logger.error(f"Short link cache write failed: {e}")
+
+def prune():
+    """Drop expired entries and the least recently used ones beyond the size limit"""
+    conn = _connect()
+    conn.execute("DELETE FROM short_links WHERE expires_at <= ?", (time.time(),))
+    
+    count = conn.execute("SELECT COUNT(*) FROM short_links").fetchone()[0]
+    if count > CACHE_MAX_ENTRIES:
+        conn.execute(
+            "DELETE FROM short_links WHERE rowid IN "
+            "(SELECT rowid FROM short_links ORDER BY last_used LIMIT ?)",
+            (count - CACHE_MAX_ENTRIES,)
+        )
+
+def invalidate_shortener(shortener):
+    """Drop every cached link for a shortener"""
+    identity = shortener_identity(shortener)
+    
+    for key in [key for key in _memory if key[0] == identity]:
+        del _memory[key]
+    
+    try:
+        _connect().execute("DELETE FROM short_links WHERE shortener = ?", (identity,))
+    except sqlite3.Error as e:
+        logger.error(f"Short link cache invalidation failed: {e}")
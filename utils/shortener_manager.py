@@ -1,42 +1,53 @@
-import json
-import os
+from utils import registry, rate_limiter, circuit_breaker, key_pool, short_cache
 
 SHORTENERS_FILE = 'shorteners.json'
 
 def load_shorteners():
     """Load shorteners from JSON file"""
-    if not os.path.exists(SHORTENERS_FILE):
-        return []
-    
-    try:
-        with open(SHORTENERS_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+    return registry.load(SHORTENERS_FILE)
 
 def save_shorteners(shorteners):
     """Save shorteners to JSON file"""
-    try:
-        with open(SHORTENERS_FILE, 'w') as f:
-            json.dump(shorteners, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving shorteners: {e}")
-        return False
+    return registry.save(SHORTENERS_FILE, shorteners)
 
 def add_shortener(name, base, api_key):
     """Add a new shortener"""
-    shorteners = load_shorteners()
-    
-    new_shortener = {
-        "name": name,
-        "base": base,
-        "api": api_key,
-        "status": "active"
-    }
+    with registry.editing(SHORTENERS_FILE):
+        shorteners = load_shorteners()
+        
+        new_shortener = {
+            "name": name,
+            "base": base,
+            "api": api_key,
+            "status": "active"
+        }
+        
+        shorteners.append(new_shortener)
+        return save_shorteners(shorteners)
+
+def get_shortener(name):
+    """Get a shortener by name, or None"""
+    for shortener in load_shorteners():
+        if shortener['name'] == name:
+            return shortener
     
-    shorteners.append(new_shortener)
-    return save_shorteners(shorteners)
+    return None
+
+def add_shortener_key(name, api_key):
+    """Add an API key to an existing shortener's key pool"""
+    with registry.editing(SHORTENERS_FILE):
+        shorteners = load_shorteners()
+        
+        for shortener in shorteners:
+            if shortener['name'] != name:
+                continue
+            
+            if api_key not in (key for key, _ in key_pool.api_keys(shortener)):
+                shortener.setdefault('keys', []).append(api_key)
+            
+            return save_shorteners(shorteners)
+        
+        return False
 
 def list_shorteners():
     """List all shorteners"""
@@ -48,43 +59,50 @@ def list_shorteners():
     result = "📜 **Shorteners List:**\n\n"
     for i, shortener in enumerate(shorteners, 1):
         status = "Active" if shortener['status'] == 'active' else "Paused"
-        result += f"{i}️⃣ {shortener['name']} ({status})\n"
+        breaker = circuit_breaker.describe('shortener', shortener)
+        limits = rate_limiter.describe('shortener', shortener)
+        keys = key_pool.describe('shortener', shortener)
+        if keys:
+            limits += f", {keys}"
+        result += f"{i}️⃣ {shortener['name']} ({status}, {breaker}) - {limits}\n"
     
     return result
 
 def toggle_shortener(index):
     """Toggle shortener status between active and paused"""
-    shorteners = load_shorteners()
-    
-    if index < 0 or index >= len(shorteners):
-        return "⚠️ Invalid shortener index."
-    
-    current_status = shorteners[index]['status']
-    new_status = 'paused' if current_status == 'active' else 'active'
-    shorteners[index]['status'] = new_status
-    
-    if save_shorteners(shorteners):
-        status_text = "Paused" if new_status == 'paused' else "Resumed"
-        return f"✅ Shortener '{shorteners[index]['name']}' {status_text}."
-    else:
-        return "⚠️ Failed to update shortener status."
+    with registry.editing(SHORTENERS_FILE):
+        shorteners = load_shorteners()
+        
+        if index < 0 or index >= len(shorteners):
+            return "⚠️ Invalid shortener index."
+        
+        current_status = shorteners[index]['status']
+        new_status = 'paused' if current_status == 'active' else 'active'
+        shorteners[index]['status'] = new_status
+        
+        if save_shorteners(shorteners):
+            status_text = "Paused" if new_status == 'paused' else "Resumed"
+            return f"✅ Shortener '{shorteners[index]['name']}' {status_text}."
+        else:
+            return "⚠️ Failed to update shortener status."
 
 def remove_shortener(index):
     """Remove a shortener"""
-    shorteners = load_shorteners()
-    
-    if index < 0 or index >= len(shorteners):
-        return "⚠️ Invalid shortener index."
-    
-    removed_name = shorteners[index]['name']
-    shorteners.pop(index)
-    
-    if save_shorteners(shorteners):
-        return f"✅ Shortener '{removed_name}' removed successfully."
-    else:
-        return "⚠️ Failed to remove shortener."
+    with registry.editing(SHORTENERS_FILE):
+        shorteners = load_shorteners()
+        
+        if index < 0 or index >= len(shorteners):
+            return "⚠️ Invalid shortener index."
+        
+        removed = shorteners.pop(index)
+        removed_name = removed['name']
+        
+        if save_shorteners(shorteners):
+            short_cache.invalidate_shortener(removed)
+            return f"✅ Shortener '{removed_name}' removed successfully."
+        else:
+            return "⚠️ Failed to remove shortener."
 
 def get_active_shorteners():
     """Get list of active shorteners"""
-    shorteners = load_shorteners()
-    return [s for s in shorteners if s['status'] == 'active']
\ No newline at end of file
+    return registry.active(SHORTENERS_FILE)
\ No newline at end of file
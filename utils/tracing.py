@@ -0,0 +1,200 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils.batch_writer import BatchWriter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = 'traces.jsonl'
+SLOW_LOG_FILE = 'slow_requests.jsonl'
+
+# Share of requests written to TRACE_FILE, and seconds after which a request is
+# always written to SLOW_LOG_FILE, overridable from .env
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '20'))
+
+# Spans kept per trace; a request that makes more keeps the first ones
+MAX_SPANS = 200
+
+# The current request's trace, and the span new spans are nested under
+_trace = contextvars.ContextVar('trace', default=None)
+_parent = contextvars.ContextVar('trace_parent', default=None)
+
+def _write_traces(items):
+    """Append finished traces to the trace file and the slow request log"""
+    sampled = [json.dumps(trace, default=str) + '\n' for trace, slow in items if not slow]
+    slow = [json.dumps(trace, default=str) + '\n' for trace, slow in items if slow]
+    
+    for path, lines in ((TRACE_FILE, sampled + slow), (SLOW_LOG_FILE, slow)):
+        if lines:
+            with open(path, 'a') as f:
+                f.writelines(lines)
+
+_writer = BatchWriter(_write_traces, max_batch=50, interval=1.0, name='Traces')
+
+async def start_trace_writer():
+    """Start batching trace writes"""
+    _writer.start()
+
+async def stop_trace_writer():
+    """Flush pending traces and stop the writer"""
+    await _writer.stop()
+
+def start(name, **attrs):
+    """Start a trace for a request, making it current for this task and the tasks it starts"""
+    trace = {
+        'id': uuid.uuid4().hex[:16],
+        'name': name,
+        'start': time.time(),
+        'attrs': attrs,
+        'spans': [],
+        '_started': time.monotonic(),
+        '_next_id': 0,
+        '_finished': False
+    }
+    
+    attach(trace)
+    return trace
+
+def attach(trace):
+    """Make a trace current, e.g. in the worker that picks up a traced job"""
+    _trace.set(trace)
+    _parent.set(None)
+
+def current():
+    """Get the current trace, or None"""
+    return _trace.get()
+
+def _new_span_id(trace):
+    """Number the spans of a trace in the order they start"""
+    trace['_next_id'] += 1
+    return trace['_next_id']
+
+def _add(trace, span_id, parent, name, started, ended, attrs):
+    """Store a finished span"""
+    if trace['_finished'] or len(trace['spans']) >= MAX_SPANS:
+        return
+    
+    trace['spans'].append({
+        'id': span_id,
+        'parent': parent,
+        'name': name,
+        'start': round(started - trace['_started'], 4),
+        'duration': round(ended - started, 4),
+        'attrs': attrs
+    })
+
+def add_span(name, started, ended=None, **attrs):
+    """Record a span of the current trace that already happened, from monotonic times"""
+    trace = _trace.get()
+    
+    if trace is not None:
+        ended = time.monotonic() if ended is None else ended
+        _add(trace, _new_span_id(trace), _parent.get(), name, started, ended, attrs)
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block as a span of the current trace.
+    
+    Yields the span's attributes so the block can add to them. Spans started
+    inside the block are nested under it. Without a current trace this only
+    runs the block.
+    """
+    trace = _trace.get()
+    
+    if trace is None:
+        yield attrs
+        return
+    
+    span_id = _new_span_id(trace)
+    parent = _parent.get()
+    token = _parent.set(span_id)
+    started = time.monotonic()
+    
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        _add(trace, span_id, parent, name, started, time.monotonic(), attrs)
+
+def span_future(name, future, **attrs):
+    """Record a span of the current trace that ends when `future` is done"""
+    trace = _trace.get()
+    
+    if trace is None:
+        return
+    
+    span_id = _new_span_id(trace)
+    parent = _parent.get()
+    started = time.monotonic()
+    
+    future.add_done_callback(
+        lambda future: _add(trace, span_id, parent, name, started, time.monotonic(), attrs)
+    )
+
+def finish(trace, **attrs):
+    """
+    End a trace, writing it if it is sampled or slow.
+    
+    Spans that end after this are dropped.
+    """
+    if trace is None or trace['_finished']:
+        return
+    
+    trace['_finished'] = True
+    trace['attrs'].update(attrs)
+    trace['duration'] = round(time.monotonic() - trace['_started'], 4)
+    
+    slow = trace['duration'] >= SLOW_REQUEST_SECONDS
+    if not slow and random.random() >= TRACE_SAMPLE_RATE:
+        return
+    
+    record = {k: v for k, v in trace.items() if not k.startswith('_')}
+    _writer.add((record, slow))
+    
+    if slow:
+        logger.warning(f"Slow request {trace['id']}: {trace['name']} took {trace['duration']:.1f}s")
+
+def slow_requests(count):
+    """Load the last `count` slow requests from the slow request log, newest first"""
+    try:
+        with open(SLOW_LOG_FILE, 'rb') as f:
+            # The log only grows; read back from the end until there are enough lines
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            chunk = 64 * 1024
+            
+            while True:
+                offset = max(0, size - chunk)
+                f.seek(offset)
+                lines = f.read().splitlines()
+                if offset == 0 or len(lines) > count:
+                    break
+                chunk *= 4
+    except FileNotFoundError:
+        return []
+    
+    # The first line may be cut off part way
+    if offset:
+        lines = lines[1:]
+    
+    traces = []
+    for line in reversed(lines[-count:]):
+        try:
+            traces.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    
+    return traces
@@ -1,42 +1,53 @@
-import json
-import os
+from utils import registry, rate_limiter, circuit_breaker, key_pool
 
 UPLOADS_FILE = 'uploads.json'
 
 def load_uploaders():
     """Load uploaders from JSON file"""
-    if not os.path.exists(UPLOADS_FILE):
-        return []
-    
-    try:
-        with open(UPLOADS_FILE, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+    return registry.load(UPLOADS_FILE)
 
 def save_uploaders(uploaders):
     """Save uploaders to JSON file"""
-    try:
-        with open(UPLOADS_FILE, 'w') as f:
-            json.dump(uploaders, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving uploaders: {e}")
-        return False
+    return registry.save(UPLOADS_FILE, uploaders)
 
 def add_uploader(name, endpoint, api_key):
     """Add a new uploader"""
-    uploaders = load_uploaders()
-    
-    new_uploader = {
-        "name": name,
-        "endpoint": endpoint,
-        "api": api_key,
-        "status": "active"
-    }
+    with registry.editing(UPLOADS_FILE):
+        uploaders = load_uploaders()
+        
+        new_uploader = {
+            "name": name,
+            "endpoint": endpoint,
+            "api": api_key,
+            "status": "active"
+        }
+        
+        uploaders.append(new_uploader)
+        return save_uploaders(uploaders)
+
+def get_uploader(name):
+    """Get a uploader by name, or None"""
+    for uploader in load_uploaders():
+        if uploader['name'] == name:
+            return uploader
     
-    uploaders.append(new_uploader)
-    return save_uploaders(uploaders)
+    return None
+
+def add_uploader_key(name, api_key):
+    """Add an API key to an existing uploader's key pool"""
+    with registry.editing(UPLOADS_FILE):
+        uploaders = load_uploaders()
+        
+        for uploader in uploaders:
+            if uploader['name'] != name:
+                continue
+            
+            if api_key not in (key for key, _ in key_pool.api_keys(uploader)):
+                uploader.setdefault('keys', []).append(api_key)
+            
+            return save_uploaders(uploaders)
+        
+        return False
 
 def list_uploaders():
     """List all uploaders"""
@@ -48,43 +59,49 @@ def list_uploaders():
     result = "🗂️ **Uploaders List:**\n\n"
     for i, uploader in enumerate(uploaders, 1):
         status = "Active" if uploader['status'] == 'active' else "Paused"
-        result += f"{i}️⃣ {uploader['name']} ({status})\n"
+        breaker = circuit_breaker.describe('uploader', uploader)
+        limits = rate_limiter.describe('uploader', uploader)
+        keys = key_pool.describe('uploader', uploader)
+        if keys:
+            limits += f", {keys}"
+        result += f"{i}️⃣ {uploader['name']} ({status}, {breaker}) - {limits}\n"
     
     return result
 
 def toggle_uploader(index):
     """Toggle uploader status between active and paused"""
-    uploaders = load_uploaders()
-    
-    if index < 0 or index >= len(uploaders):
-        return "⚠️ Invalid uploader index."
-    
-    current_status = uploaders[index]['status']
-    new_status = 'paused' if current_status == 'active' else 'active'
-    uploaders[index]['status'] = new_status
-    
-    if save_uploaders(uploaders):
-        status_text = "Paused" if new_status == 'paused' else "Resumed"
-        return f"✅ Uploader '{uploaders[index]['name']}' {status_text}."
-    else:
-        return "⚠️ Failed to update uploader status."
+    with registry.editing(UPLOADS_FILE):
+        uploaders = load_uploaders()
+        
+        if index < 0 or index >= len(uploaders):
+            return "⚠️ Invalid uploader index."
+        
+        current_status = uploaders[index]['status']
+        new_status = 'paused' if current_status == 'active' else 'active'
+        uploaders[index]['status'] = new_status
+        
+        if save_uploaders(uploaders):
+            status_text = "Paused" if new_status == 'paused' else "Resumed"
+            return f"✅ Uploader '{uploaders[index]['name']}' {status_text}."
+        else:
+            return "⚠️ Failed to update uploader status."
 
 def remove_uploader(index):
     """Remove an uploader"""
-    uploaders = load_uploaders()
-    
-    if index < 0 or index >= len(uploaders):
-        return "⚠️ Invalid uploader index."
-    
-    removed_name = uploaders[index]['name']
-    uploaders.pop(index)
-    
-    if save_uploaders(uploaders):
-        return f"✅ Uploader '{removed_name}' removed successfully."
-    else:
-        return "⚠️ Failed to remove uploader."
+    with registry.editing(UPLOADS_FILE):
+        uploaders = load_uploaders()
+        
+        if index < 0 or index >= len(uploaders):
+            return "⚠️ Invalid uploader index."
+        
+        removed_name = uploaders[index]['name']
+        uploaders.pop(index)
+        
+        if save_uploaders(uploaders):
+            return f"✅ Uploader '{removed_name}' removed successfully."
+        else:
+            return "⚠️ Failed to remove uploader."
 
 def get_active_uploaders():
     """Get list of active uploaders"""
-    uploaders = load_uploaders()
-    return [u for u in uploaders if u['status'] == 'active']
\ No newline at end of file
+    return registry.active(UPLOADS_FILE)
\ No newline at end of file
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from aiohttp import web
+from dotenv import load_dotenv
+from telegram import Bot, Update
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Webhook settings, from .env
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '1'))
+
+# Updates waiting for a worker process before new ones are rejected
+WORKER_QUEUE_SIZE = 1000
+
+# This process's shard: (worker index, worker count)
+_shard = (0, 1)
+
+def owns_chat(chat_id):
+    """Check if this process handles a chat's updates"""
+    index, workers = _shard
+    return chat_id % workers == index
+
+def shard_key(data):
+    """
+    Get the id that decides which worker handles an update.
+    
+    Updates from one chat always go to the same worker, so per-chat state such as
+    ConversationHandler steps lives in one process.
+    """
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                  'my_chat_member', 'chat_member', 'chat_join_request'):
+        chat = (data.get(field) or {}).get('chat')
+        if chat:
+            return chat['id']
+    
+    callback_message = (data.get('callback_query') or {}).get('message') or {}
+    if callback_message.get('chat'):
+        return callback_message['chat']['id']
+    
+    # Inline queries and the like have no chat; fall back to the user
+    for value in data.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from']['id']
+    
+    return data.get('update_id', 0)
+
+def _make_server(dispatch):
+    """Build the HTTP app that receives updates and passes them to `dispatch`"""
+    async def receive(request):
+        if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        
+        if not dispatch(data):
+            # Telegram retries updates that were not accepted
+            return web.Response(status=503)
+        
+        return web.Response()
+    
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    return app
+
+async def _set_webhook(token):
+    """Point Telegram at WEBHOOK_URL, if one is configured"""
+    if not WEBHOOK_URL:
+        logger.warning("WEBHOOK_URL not set; not registering the webhook with Telegram")
+        return
+    
+    async with Bot(token) as bot:
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES
+        )
+    logger.info(f"Webhook registered at {WEBHOOK_URL}")
+
+async def _serve(dispatch):
+    """Run the webhook server until SIGINT/SIGTERM"""
+    runner = web.AppRunner(_make_server(dispatch), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+    logger.info(f"Listening for updates on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+async def _start_application(application):
+    """Start an application the way run_polling would, minus the polling"""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+async def _stop_application(application):
+    """Stop an application the way run_polling would"""
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+async def _run_single(token, build_application):
+    """Serve the webhook and handle updates in this process"""
+    application = build_application(token)
+    await _start_application(application)
+    
+    def dispatch(data):
+        try:
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+        except asyncio.QueueFull:
+            return False
+        return True
+    
+    try:
+        await _set_webhook(token)
+        await _serve(dispatch)
+    finally:
+        await _stop_application(application)
+
+async def _run_worker(token, build_application, queue, index):
+    """Handle the updates of one shard"""
+    global _shard
+    _shard = (index, WEBHOOK_WORKERS)
+    
+    # Give every worker its own metrics port
+    from utils import metrics
+    if metrics.METRICS_PORT:
+        metrics.METRICS_PORT += index
+    
+    # Telegram's flood limits are per bot, so the workers split them
+    from utils import sender
+    sender.share_limits(WEBHOOK_WORKERS)
+    
+    application = build_application(token)
+    await _start_application(application)
+    logger.info(f"Worker {index} ready")
+    
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        await _stop_application(application)
+
+def _worker_main(token, build_application, queue, index):
+    """Entry point of a worker process"""
+    # The parent handles Ctrl+C and stops workers through their queues
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(token, build_application, queue, index))
+
+async def _run_sharded(token, build_application, workers):
+    """Serve the webhook here and hand updates to worker processes, sharded by chat"""
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(WORKER_QUEUE_SIZE) for _ in range(workers)]
+    processes = [
+        context.Process(
+            target=_worker_main,
+            args=(token, build_application, queues[index], index),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        for index in range(workers)
+    ]
+    
+    for process in processes:
+        process.start()
+    
+    def dispatch(data):
+        try:
+            queues[shard_key(data) % workers].put_nowait(data)
+        except Exception:
+            return False
+        return True
+    
+    try:
+        await _set_webhook(token)
+        await _serve(dispatch)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            await asyncio.get_running_loop().run_in_executor(None, process.join, 30)
+
+def run_webhook(token, build_application):
+    """
+    Receive updates over a webhook instead of polling.
+    
+    `build_application(token)` must be a module-level function returning a fully
+    configured Application; with WEBHOOK_WORKERS > 1 each worker process builds its own.
+    """
+    if WEBHOOK_WORKERS > 1:
+        asyncio.run(_run_sharded(token, build_application, WEBHOOK_WORKERS))
+    else:
+        asyncio.run(_run_single(token, build_application))